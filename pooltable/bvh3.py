@@ -0,0 +1,261 @@
+"""Bounding volume hierarchy (BVH) of axis aligned bounding boxes over the 
+triangles of a mesh. The tree is stored in flat arrays and queries are 
+processed in batches: the traversal keeps a frontier of (query, node) pairs 
+that is tested against the node boxes in one vectorized step per tree level.
+"""
+
+import numpy as np
+import geometry3, mesh3
+
+def mesh_triangles(mesh):
+    """Triangulates the faces of a mesh (Mesh3 or PackedMesh3). Returns 
+    (triangles, face_ids) where triangles is (T,3,3) and face_ids (T,) tells 
+    which face each triangle came from.
+    """
+    triangles, face_ids = [], []
+    for fk, face in enumerate(mesh.fs):
+        pts = np.asarray(face.pts, dtype=float)
+        for ind in face.triangle_indices():
+            triangles.append(pts[ind])
+            face_ids.append(fk)
+    return np.array(triangles).reshape(-1, 3, 3), np.array(face_ids, dtype=np.int64)
+
+def _first_per_group(groups, values):
+    """Returns indices of the smallest value in each group (ties to the first).
+    """
+    order = np.lexsort((values, groups))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = groups[order[1:]] != groups[order[:-1]]
+    return order[first]
+
+class BVH3:
+    """Median split BVH over triangles. Node k has bounds (node_min[k], node_max[k]) 
+    and children node_left[k], node_right[k], or -1 for leaves. The triangles 
+    of node k are triangles[order[node_start[k]:node_start[k]+node_count[k]]].
+    """
+    triangles: np.ndarray       # (T,3,3)
+    face_ids: np.ndarray        # (T,)
+    order: np.ndarray           # (T,)
+    node_min: np.ndarray        # (K,3)
+    node_max: np.ndarray        # (K,3)
+    node_left: np.ndarray       # (K,)
+    node_right: np.ndarray      # (K,)
+    node_start: np.ndarray      # (K,)
+    node_count: np.ndarray      # (K,)
+
+    def __init__(self, triangles, face_ids=None, leaf_size=4):
+        self.triangles = np.asarray(triangles, dtype=float).reshape(-1, 3, 3)
+        n = len(self.triangles)
+        if n == 0:
+            raise ValueError("Cannot build BVH3 without triangles.")
+        self.face_ids = np.arange(n) if face_ids is None else np.asarray(face_ids, dtype=np.int64)
+        self.leaf_size = leaf_size
+        self._build()
+
+    @classmethod
+    def from_mesh(cls, mesh, leaf_size=4):
+        triangles, face_ids = mesh_triangles(mesh)
+        return cls(triangles, face_ids, leaf_size)
+
+    def _build(self):
+        tri_min = np.min(self.triangles, axis=1)
+        tri_max = np.max(self.triangles, axis=1)
+        centroids = np.mean(self.triangles, axis=1)
+        order = np.arange(len(self.triangles))
+        node_min, node_max, left, right, start, count = [], [], [], [], [], []
+
+        def new_node(s, e):
+            ind = order[s:e]
+            node_min.append(np.min(tri_min[ind], axis=0))
+            node_max.append(np.max(tri_max[ind], axis=0))
+            left.append(-1)
+            right.append(-1)
+            start.append(s)
+            count.append(e-s)
+            return len(start) - 1
+
+        stack = [new_node(0, len(order))]
+        while stack:
+            node = stack.pop()
+            s, e = start[node], start[node] + count[node]
+            if e - s <= self.leaf_size:
+                continue
+            c = centroids[order[s:e]]
+            extent = np.max(c, axis=0) - np.min(c, axis=0)
+            axis = int(np.argmax(extent))
+            if extent[axis] == 0.0:
+                continue
+            # Median split along the longest axis of the centroid bounds:
+            mid = (s+e) // 2
+            order[s:e] = order[s:e][np.argpartition(c[:,axis], mid-s)]
+            left[node] = new_node(s, mid)
+            right[node] = new_node(mid, e)
+            stack.extend((left[node], right[node]))
+
+        self.order = order
+        self.node_min = np.array(node_min)
+        self.node_max = np.array(node_max)
+        self.node_left = np.array(left, dtype=np.int64)
+        self.node_right = np.array(right, dtype=np.int64)
+        self.node_start = np.array(start, dtype=np.int64)
+        self.node_count = np.array(count, dtype=np.int64)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_start)
+
+    def _expand_leaves(self, queries, nodes):
+        """Expands (query, leaf node) pairs into (query, triangle) pairs.
+        """
+        counts = self.node_count[nodes]
+        q = np.repeat(queries, counts)
+        ramp = np.arange(len(q)) - np.repeat(np.cumsum(counts)-counts, counts)
+        return q, self.order[np.repeat(self.node_start[nodes], counts) + ramp]
+
+    def _split_frontier(self, queries, nodes):
+        """Returns (leaf_queries, leaf_nodes, child_queries, child_nodes).
+        """
+        leaf = self.node_left[nodes] < 0
+        inner_q, inner_n = queries[~leaf], nodes[~leaf]
+        child_q = np.concatenate((inner_q, inner_q))
+        child_n = np.concatenate((self.node_left[inner_n], self.node_right[inner_n]))
+        return queries[leaf], nodes[leaf], child_q, child_n
+
+    def _box_distance2(self, points, nodes):
+        d = np.maximum(np.maximum(self.node_min[nodes] - points, points - self.node_max[nodes]), 0.0)
+        return np.sum(d*d, axis=-1)
+
+    def intersect_rays(self, origins, directions, t_max=np.inf):
+        """Finds the first hit of each ray origins[k]+t*directions[k], 0<=t<=t_max.
+        Returns (t, face_ids, triangle_ids, bary) where misses have t=inf and ids -1.
+        """
+        origins = np.asarray(origins, dtype=float).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=float).reshape(-1, 3)
+        n = len(origins)
+        best_t = np.full(n, float(t_max))
+        best_tri = np.full(n, -1, dtype=np.int64)
+        best_bary = np.zeros((n, 3))
+        with np.errstate(divide="ignore"):
+            inv_d = 1.0 / directions
+
+        queries, nodes = np.arange(n), np.zeros(n, dtype=np.int64)
+        while len(queries) > 0:
+            # Slab test, nan from 0*inf is ignored by fmin/fmax:
+            with np.errstate(invalid="ignore"):
+                t1 = (self.node_min[nodes] - origins[queries]) * inv_d[queries]
+                t2 = (self.node_max[nodes] - origins[queries]) * inv_d[queries]
+            t_near = np.max(np.fmin(t1, t2), axis=1)
+            t_far = np.min(np.fmax(t1, t2), axis=1)
+            hit = (t_near <= t_far) & (t_far >= 0.0) & (t_near <= best_t[queries])
+            leaf_q, leaf_n, queries, nodes = self._split_frontier(queries[hit], nodes[hit])
+            if len(leaf_q) == 0:
+                continue
+            q, tri = self._expand_leaves(leaf_q, leaf_n)
+            t, bary, valid = self._ray_triangle(origins[q], directions[q], self.triangles[tri])
+            valid &= t <= best_t[q]
+            q, tri, t, bary = q[valid], tri[valid], t[valid], bary[valid]
+            first = _first_per_group(q, t)
+            q, tri, t, bary = q[first], tri[first], t[first], bary[first]
+            better = t <= best_t[q]
+            best_t[q[better]] = t[better]
+            best_tri[q[better]] = tri[better]
+            best_bary[q[better]] = bary[better]
+
+        missed = best_tri < 0
+        best_t[missed] = np.inf
+        return best_t, np.where(missed, -1, self.face_ids[best_tri]), best_tri, best_bary
+
+    @staticmethod
+    def _ray_triangle(origins, directions, triangles):
+        """Moller-Trumbore ray-triangle intersection for pairs. Returns (t, bary, hit).
+        """
+        a = triangles[:,0]
+        e1 = triangles[:,1] - a
+        e2 = triangles[:,2] - a
+        p = np.cross(directions, e2)
+        det = np.sum(e1*p, axis=1)
+        ok = np.abs(det) > 1.0e-15
+        inv_det = 1.0 / np.where(ok, det, 1.0)
+        s = origins - a
+        u = np.sum(s*p, axis=1) * inv_det
+        q = np.cross(s, e1)
+        v = np.sum(directions*q, axis=1) * inv_det
+        t = np.sum(e2*q, axis=1) * inv_det
+        hit = ok & (u >= 0.0) & (v >= 0.0) & (u+v <= 1.0) & (t >= 0.0)
+        return t, np.column_stack((1.0-u-v, u, v)), hit
+
+    def _closest_in_leaves(self, points, leaf_q, leaf_n):
+        q, tri = self._expand_leaves(leaf_q, leaf_n)
+        t = self.triangles[tri]
+        closest, bary = geometry3.closest_point_barycentric(points[q], t[:,0], t[:,1], t[:,2])
+        d2 = np.sum((closest - points[q])**2, axis=1)
+        first = _first_per_group(q, d2)
+        return q[first], tri[first], closest[first], bary[first], d2[first]
+
+    def closest_points(self, points):
+        """Batched closest point on the mesh. Returns (q, d, face_ids, triangle_ids, bary)
+        like geometry3.closest_points but visits only O(log T) nodes per point.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        n = len(points)
+        best_d2 = np.full(n, np.inf)
+        best = (np.zeros((n, 3)), np.zeros(n, dtype=np.int64), np.zeros((n, 3)))
+
+        def update(q, tri, closest, bary, d2):
+            better = d2 < best_d2[q]
+            q = q[better]
+            best_d2[q] = d2[better]
+            best[0][q] = closest[better]
+            best[1][q] = tri[better]
+            best[2][q] = bary[better]
+
+        # Initial upper bounds from a greedy descent towards the nearest child:
+        nodes = np.zeros(n, dtype=np.int64)
+        inner = self.node_left[nodes] >= 0
+        while np.any(inner):
+            ind = np.nonzero(inner)[0]
+            l, r = self.node_left[nodes[ind]], self.node_right[nodes[ind]]
+            go_left = self._box_distance2(points[ind], l) <= self._box_distance2(points[ind], r)
+            nodes[ind] = np.where(go_left, l, r)
+            inner = self.node_left[nodes] >= 0
+        update(*self._closest_in_leaves(points, np.arange(n), nodes))
+
+        # Then visit every node that could contain something closer:
+        queries, nodes = np.arange(n), np.zeros(n, dtype=np.int64)
+        while len(queries) > 0:
+            keep = self._box_distance2(points[queries], nodes) < best_d2[queries]
+            leaf_q, leaf_n, queries, nodes = self._split_frontier(queries[keep], nodes[keep])
+            if len(leaf_q) > 0:
+                update(*self._closest_in_leaves(points, leaf_q, leaf_n))
+
+        closest, tri, bary = best
+        return closest, np.sqrt(best_d2), self.face_ids[tri], tri, bary
+
+    def locate_points(self, points, EPSILON=1.0e-9):
+        """Finds all triangles that contain each point (up to distance EPSILON). 
+        Returns (point_ids, face_ids, triangle_ids, bary) as flat arrays of 
+        matching pairs, ordered by point.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        found_q, found_tri, found_bary = [], [], []
+        queries, nodes = np.arange(len(points)), np.zeros(len(points), dtype=np.int64)
+        while len(queries) > 0:
+            keep = self._box_distance2(points[queries], nodes) <= EPSILON**2
+            leaf_q, leaf_n, queries, nodes = self._split_frontier(queries[keep], nodes[keep])
+            if len(leaf_q) == 0:
+                continue
+            q, tri = self._expand_leaves(leaf_q, leaf_n)
+            t = self.triangles[tri]
+            closest, bary = geometry3.closest_point_barycentric(points[q], t[:,0], t[:,1], t[:,2])
+            inside = np.sum((closest - points[q])**2, axis=1) <= EPSILON**2
+            found_q.append(q[inside])
+            found_tri.append(tri[inside])
+            found_bary.append(bary[inside])
+        if not found_q:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros((0, 3))
+        q, tri, bary = np.concatenate(found_q), np.concatenate(found_tri), np.concatenate(found_bary)
+        order = np.lexsort((tri, q))
+        return q[order], self.face_ids[tri[order]], tri[order], bary[order]
+
+    def __repr__(self):
+        return f"BVH3(#triangles={len(self.triangles)}, #nodes={self.n_nodes})"
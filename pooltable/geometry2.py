@@ -110,6 +110,114 @@ def intersections_circle_ls(circle_p, circle_r, ls: LineSegment2):
         intersections.append(ls.param(t2))
     return intersections
 
+# Vectorized versions of the above. Points are given as (N,2) arrays and 
+# line segments as (M,2,2) arrays where segments[k] = (z1, z2).
+
+def _as_points(zs) -> np.ndarray:
+    return np.asarray(zs, dtype=float).reshape(-1, 2)
+
+def _as_segments(segments) -> np.ndarray:
+    if len(segments) > 0 and isinstance(segments[0], LineSegment2):
+        segments = [(ls.z1, ls.z2) for ls in segments]
+    return np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+
+def _dist_point_segment(p, z1, v, degenerate):
+    """Broadcasting helper: distance from p to segment z1+t*v, t in [0,1].
+    """
+    w = p - z1
+    vv = np.sum(v*v, axis=-1)
+    t = np.clip(np.sum(w*v, axis=-1) / np.where(degenerate, 1.0, vv), 0.0, 1.0)
+    t = np.where(degenerate, 0.0, t)
+    return np.linalg.norm(w - t[...,None]*v, axis=-1), t
+
+def _is_degenerate(segments) -> np.ndarray:
+    # Same criterion as isclose(z1, z2):
+    z1, z2 = segments[:,0], segments[:,1]
+    tol = np.maximum(1.0e-9*np.maximum(np.linalg.norm(z1, axis=-1), np.linalg.norm(z2, axis=-1)), 1.0e-20)
+    return np.linalg.norm(z2-z1, axis=-1) <= tol
+
+def dist_points_segments(zs, segments):
+    """Vectorized dist_z_ls: returns (d,t) as (N,M) arrays where d[i,k] is 
+    the distance from zs[i] to segments[k] realized at parameter t[i,k].
+    """
+    zs, segments = _as_points(zs), _as_segments(segments)
+    z1, v = segments[:,0], segments[:,1]-segments[:,0]
+    return _dist_point_segment(zs[:,None,:], z1[None], v[None], _is_degenerate(segments)[None])
+
+def nearest_segments(zs, segments):
+    """For each point finds the closest segment. Returns (d,index,t) as 
+    (N,) arrays, ties resolve to the smallest index.
+    """
+    d, t = dist_points_segments(zs, segments)
+    index = np.argmin(d, axis=1)
+    rows = np.arange(len(d))
+    return d[rows,index], index, t[rows,index]
+
+def dist_segments_segments(segments1, segments2):
+    """Returns (d,t1,t2) as (N,M) arrays where d[i,k] is the distance between 
+    segments1[i] and segments2[k], realized at parameters t1[i,k] and t2[i,k].
+    """
+    s1, s2 = _as_segments(segments1)[:,None], _as_segments(segments2)[None]
+    a1, v1 = s1[...,0,:], s1[...,1,:]-s1[...,0,:]
+    a2, v2 = s2[...,0,:], s2[...,1,:]-s2[...,0,:]
+    deg1 = _is_degenerate(_as_segments(segments1))[:,None]
+    deg2 = _is_degenerate(_as_segments(segments2))[None]
+    shape = np.broadcast_shapes(a1.shape[:-1], a2.shape[:-1])
+
+    # Distance is realized at an endpoint of one of the segments unless they cross:
+    candidates = []
+    d, t = _dist_point_segment(a1, a2, v2, deg2)
+    candidates.append((d, np.zeros(shape), t))
+    d, t = _dist_point_segment(a1+v1, a2, v2, deg2)
+    candidates.append((d, np.ones(shape), t))
+    d, t = _dist_point_segment(a2, a1, v1, deg1)
+    candidates.append((d, t, np.zeros(shape)))
+    d, t = _dist_point_segment(a2+v2, a1, v1, deg1)
+    candidates.append((d, t, np.ones(shape)))
+    d = np.stack([c[0] for c in candidates])
+    best = np.argmin(d, axis=0)
+    pick = lambda k: np.take_along_axis(np.stack([np.broadcast_to(c[k], shape) for c in candidates]), best[None], axis=0)[0]
+    d, t1, t2 = pick(0), pick(1), pick(2)
+
+    cross = lambda p, q: p[...,0]*q[...,1] - p[...,1]*q[...,0]
+    denom = cross(v1, v2)
+    safe = np.where(denom == 0.0, 1.0, denom)
+    s = cross(a2-a1, v2) / safe
+    u = cross(a2-a1, v1) / safe
+    crossing = (denom != 0.0) & ~deg1 & ~deg2 & (s >= 0.0) & (s <= 1.0) & (u >= 0.0) & (u <= 1.0)
+    return np.where(crossing, 0.0, d), np.where(crossing, s, t1), np.where(crossing, u, t2)
+
+def intersections_circle_segments(centers, radii, segments):
+    """Vectorized intersections_circle_ls for N circles and M segments. Returns
+    an (N,M,2) array of segment parameters t of the intersection points, unused 
+    slots are nan. Points are then segments[k,0] + t*(segments[k,1]-segments[k,0]).
+    """
+    centers, segments = _as_points(centers), _as_segments(segments)
+    radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(centers),))
+    q = centers[:,None,:] - segments[None,:,0]
+    w = (segments[:,0] - segments[:,1])[None]
+    c0 = np.sum(q*q, axis=-1) - radii[:,None]**2
+    c1 = 2*np.sum(q*w, axis=-1)
+    c2 = np.broadcast_to(np.sum(w*w, axis=-1), c0.shape)
+    determinant = c1**2 - 4*c2*c0
+    tangent = np.abs(determinant) < 1.0e-9
+    sqrt_det = np.sqrt(np.where(determinant > 0.0, determinant, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Degenerate segments give nan here and are dropped below.
+        t1 = np.where(tangent, -c1/(2*c2), (-c1-sqrt_det)/(2*c2))
+        t2 = (-c1+sqrt_det)/(2*c2)
+    t1 = np.where((tangent | (determinant >= 0.0)) & (t1 >= 0.0) & (t1 <= 1.0), t1, np.nan)
+    t2 = np.where(~tangent & (determinant >= 0.0) & (t2 >= 0.0) & (t2 <= 1.0), t2, np.nan)
+    return np.stack((t1, t2), axis=-1)
+
+def segment_points(segments, t) -> np.ndarray:
+    """Points at parameters t on the segments, t has shape (...,M) 
+    and the result (...,M,2).
+    """
+    segments = _as_segments(segments)
+    t = np.asarray(t, dtype=float)[...,None]
+    return (1-t)*segments[:,0] + t*segments[:,1]
+
 class Polygon2():
     """A simple 2d-polygon. Not necessarily positively oriented.
     """
@@ -136,19 +244,108 @@ class Polygon2():
         result of the check, and sets checked=True if
         the polygon passed the check.
         """
-        for k, z in enumerate(self.zs):
-            zn = self.zs[(k+1)%self.n]
-            ls1 = LineSegment2(z, zn)
-            for j in range(k-1):
-                if j == 0 and k == self.n-1:
-                    continue
-                ls2 = LineSegment2(self.zs[j], self.zs[j+1])
-                d, t1, t2 = dist_ls_ls(ls1, ls2)
-                if isclose(ls1.param(t1), ls2.param(t2)):
-                    self.checked = False
-                    return False
-        self.checked = True
-        return True
+        self.checked = (len(self.intersecting_edges(first_only=True)) == 0)
+        return self.checked
+
+    def edge(self, k: int) -> LineSegment2:
+        return LineSegment2(self.zs[k], self.zs[(k+1)%self.n])
+
+    def edges_intersect(self, k1: int, k2: int) -> bool:
+        """Returns True if edges k1 and k2 intersect or touch. 
+        Edge k goes from self.zs[k] to self.zs[k+1].
+        """
+        # dist_ls_ls clips the parameters separately, so test in both orders:
+        for ls1, ls2 in ((self.edge(k1), self.edge(k2)), (self.edge(k2), self.edge(k1))):
+            d, t1, t2 = dist_ls_ls(ls1, ls2)
+            if isclose(ls1.param(t1), ls2.param(t2)):
+                return True
+        return False
+
+    def edges_conflict(self, k1: int, k2: int) -> bool:
+        """Returns True if edges k1 and k2 prevent the polygon from being simple:
+        non-adjacent edges intersect or touch, adjacent edges overlap beyond 
+        their shared vertex (the polygon folds back on itself).
+        """
+        n = self.n
+        if (k2-k1) % n == 1 or (k1-k2) % n == 1:
+            k_first, k_second = (k1, k2) if (k2-k1) % n == 1 else (k2, k1)
+            v = self.zs[k_second]
+            a, b = self.zs[k_first]-v, self.zs[(k_second+1)%n]-v
+            cross = a[0]*b[1] - a[1]*b[0]
+            return abs(cross) <= 1.0e-9*np.linalg.norm(a)*np.linalg.norm(b) and np.dot(a, b) > 0.0
+        return self.edges_intersect(k1, k2)
+
+    def intersecting_edges(self, first_only=False) -> list:
+        """Finds pairs (k1,k2), k1<k2, of edges that conflict (see 
+        edges_conflict) with a sweep-line (Shamos-Hoey) in O(n log n). The result is 
+        empty iff the polygon is simple. Otherwise at least one pair is found, 
+        but since the sweep order is not maintained past an intersection, 
+        not necessarily every pair.
+
+        The sweep line moves over the edge endpoints in lexicographic order 
+        and keeps the edges it crosses sorted from bottom to top. Before the 
+        first intersection point is reached this order is consistent and the 
+        two edges meeting there are neighbors in it, so they are tested when 
+        they become neighbors: when one of them is inserted or when an edge 
+        between them is removed.
+        """
+        n = self.n
+        if n < 4:
+            return []
+        zs = np.asarray(self.zs, dtype=float)
+        z1, z2 = zs, np.roll(zs, -1, axis=0)
+        # Orient edges from left to right (lexicographically):
+        swap = (z2[:,0] < z1[:,0]) | ((z2[:,0] == z1[:,0]) & (z2[:,1] < z1[:,1]))
+        left = [tuple(z) for z in np.where(swap[:,None], z2, z1).tolist()]
+        right = [tuple(z) for z in np.where(swap[:,None], z1, z2).tolist()]
+
+        def orientation(k, p):
+            # > 0 if p is on the left of (above) edge k, < 0 if on the right, 0 if on its line:
+            (x1, y1), (x2, y2) = left[k], right[k]
+            return (x2-x1)*(p[1]-y1) - (y2-y1)*(p[0]-x1)
+
+        def below(k, other):
+            # Is edge k, inserted at its left endpoint, below the active edge other:
+            o = orientation(other, left[k])
+            if o == 0.0:
+                o = orientation(other, right[k])
+            return o < 0.0
+
+        tol = 1.0e-9 * float(np.max(np.abs(zs)))    # bounding box test is only a quick rejection
+        found = set()
+        def test(k1, k2):
+            if (right[k1][0] < left[k2][0]-tol) or (right[k2][0] < left[k1][0]-tol):
+                return
+            if (max(left[k1][1], right[k1][1]) < min(left[k2][1], right[k2][1])-tol) or (max(left[k2][1], right[k2][1]) < min(left[k1][1], right[k1][1])-tol):
+                return
+            if self.edges_conflict(k1, k2):
+                found.add((min(k1, k2), max(k1, k2)))
+
+        # Events (point, type, edge): insertions (type 0) come before removals at the same point.
+        events = sorted([(left[k], 0, k) for k in range(n)] + [(right[k], 1, k) for k in range(n)])
+        active = []     # edges crossing the sweep line from bottom to top
+        for _, event_type, k in events:
+            if event_type == 0:
+                lo, hi = 0, len(active)
+                while lo < hi:
+                    mid = (lo+hi) // 2
+                    if below(k, active[mid]):
+                        hi = mid
+                    else:
+                        lo = mid + 1
+                active.insert(lo, k)
+                if lo > 0:
+                    test(active[lo-1], k)
+                if lo+1 < len(active):
+                    test(k, active[lo+1])
+            else:
+                index = active.index(k)
+                active.pop(index)
+                if 0 < index < len(active):
+                    test(active[index-1], active[index])
+            if first_only and found:
+                break
+        return sorted(found)
 
     @property
     def n(self):
@@ -205,55 +402,133 @@ class Polygon2():
         """Return distance and parameter t s.t. self.param(t) is the
         closest distance realizing point on the boundary.
         """
-        closest_found = [float('inf'), 0, 0.0]
-        for k in range(self.n):
-            ls = LineSegment2(self.zs[k], self.zs[(k+1)%self.n])
-            d, t = dist_z_ls(z, ls)
-            if d < closest_found[0]:
-                closest_found = d, k, t
-        return self.__signed_distance(z, *closest_found[1:3]), sum(closest_found[1:3])
+        d, k, t = nearest_segments(z, self.edges())
+        return self.__signed_distance(z, int(k[0]), float(t[0])), int(k[0]) + float(t[0])
+
+    def edges(self) -> np.ndarray:
+        """Returns the edges as an (n,2,2) array, edge k goes from zs[k] to zs[k+1].
+        """
+        zs = np.asarray(self.zs, dtype=float)
+        return np.stack((zs, np.roll(zs, -1, axis=0)), axis=1)
+
+    def contains(self, zs) -> np.ndarray:
+        """Even-odd test for an (N,2) array of points, boundary points are arbitrary.
+        """
+        zs = _as_points(zs)
+        edges = self.edges()
+        x, y = zs[:,None,0], zs[:,None,1]
+        x1, y1, x2, y2 = edges[None,:,0,0], edges[None,:,0,1], edges[None,:,1,0], edges[None,:,1,1]
+        straddles = (y1 > y) != (y2 > y)
+        x_cross = x1 + (y-y1) * (x2-x1) / np.where(y2 == y1, 1.0, y2-y1)
+        return (np.count_nonzero(straddles & (x < x_cross), axis=1) % 2) == 1
+
+    def signed_distances(self, zs):
+        """Vectorized signed_distance for an (N,2) array of points: returns 
+        (d,t) where d is negative inside the polygon and zero on the boundary.
+        """
+        zs = _as_points(zs)
+        edges = self.edges()
+        d, k, t = nearest_segments(zs, edges)
+        zb = (1-t[:,None])*edges[k,0] + t[:,None]*edges[k,1]     # closest boundary points
+        # Same criterion as isclose(z, zb):
+        on_boundary = d <= np.maximum(1.0e-9*np.maximum(np.linalg.norm(zs, axis=1), np.linalg.norm(zb, axis=1)), 1.0e-20)
+        return np.where(on_boundary, 0.0, np.where(self.contains(zs), -d, d)), k + t
 
     def triangulate(self) -> Sequence[int]:
-        """Slow and dirty, O(n^3).
+        """Triangulates the polygon by ear clipping and returns the triangles 
+        as index triples in the orientation of the polygon. Vertices that are 
+        not strictly convex are kept in a uniform grid so that an ear test only 
+        looks at the nearby ones, making this close to O(n log n) in practice.
+        Near-collinear vertices are never clipped as ears unless there is no 
+        other option left.
         """
+        n = self.n
+        if n < 3:
+            return []
+        zs = np.asarray(self.zs, dtype=float)
+        sign = -1.0 if self.signed_area() < 0.0 else 1.0
+        extent = np.max(zs, axis=0) - np.min(zs, axis=0)
+        eps = 1.0e-12 * max(extent[0], extent[1])**2
+        x = zs[:,0].tolist()
+        y = zs[:,1].tolist()
+
+        def cross(a, b, c):
+            # Twice the signed area of triangle abc, positive if abc turns like the polygon.
+            return sign*((x[b]-x[a])*(y[c]-y[a]) - (y[b]-y[a])*(x[c]-x[a]))
+
+        prev = [(k-1) % n for k in range(n)]
+        next = [(k+1) % n for k in range(n)]
+
+        # Grid of vertices that are reflex or (nearly) flat:
+        cell_size = max(float(np.sqrt(extent[0]*extent[1] / n)), max(extent[0], extent[1]) / n, 1.0e-300)
+        x0, y0 = float(np.min(zs[:,0])), float(np.min(zs[:,1]))
+        cell = lambda k: (int((x[k]-x0) / cell_size), int((y[k]-y0) / cell_size))
+        grid = {}
+        in_grid = [False]*n
+        def grid_add(k):
+            grid.setdefault(cell(k), set()).add(k)
+            in_grid[k] = True
+        def grid_remove(k):
+            grid[cell(k)].discard(k)
+            in_grid[k] = False
+        for k in range(n):
+            if cross(prev[k], k, next[k]) <= eps:
+                grid_add(k)
+
+        def is_ear(k):
+            a, c = prev[k], next[k]
+            if cross(a, k, c) <= eps:
+                return False
+            cx0 = int((min(x[a], x[k], x[c])-x0) / cell_size)
+            cx1 = int((max(x[a], x[k], x[c])-x0) / cell_size)
+            cy0 = int((min(y[a], y[k], y[c])-y0) / cell_size)
+            cy1 = int((max(y[a], y[k], y[c])-y0) / cell_size)
+            for i in range(cx0, cx1+1):
+                for j in range(cy0, cy1+1):
+                    for q in grid.get((i, j), ()):
+                        if q == a or q == k or q == c:
+                            continue
+                        if cross(a, k, q) >= -eps and cross(k, c, q) >= -eps and cross(c, a, q) >= -eps:
+                            return False
+            return True
+
+        def clip(k):
+            a, c = prev[k], next[k]
+            tri.append([a, k, c])
+            next[a] = c
+            prev[c] = a
+            if in_grid[k]:
+                grid_remove(k)
+            for q in (a, c):
+                if in_grid[q] and cross(prev[q], q, next[q]) > eps:
+                    grid_remove(q)
+
         tri = []
-        rem = [k for k in range(self.n)]
-
-        pair_usable = np.full((self.n, self.n), False)
-        for k1 in range(self.n):
-            for k2 in range(k1+2, self.n):
-                if k1 == 0 and k2 == self.n-1:
-                    # we don't want ls1 to be part of the boundary of self
-                    continue
-                ls1 = LineSegment2(self.zs[k1], self.zs[k2])
-                for j in range(self.n):
-                    jn = (j+1)%self.n
-                    if j == k1 or j == k2 or jn == k1 or jn == k2:
-                        continue
-                    ls2 = LineSegment2(self.zs[j], self.zs[jn])
-                    d, t1, t2 = dist_ls_ls(ls1, ls2)
-                    if isclose(ls1.param(t1), ls2.param(t2)):
-                        break
-                else:
-                    ls1_mid = ls1.param(0.5)
-                    d, t = self.signed_distance(ls1_mid)
-                    if (d < 0) and not (isclose(self.param(t), ls1_mid)):
-                        pair_usable[k1,k2] = True
-                        pair_usable[k2,k1] = True
-
-        while len(rem) > 3:
-            m = len(rem)
-            for k in range(m):
-                prev = rem[(k-1)%m]
-                next = rem[(k+1)%m]
-                if pair_usable[prev,next]:
-                    break
-            else:
-                # for loop ended without break
-                print('ERROR! geometry2d.py: triangulate(..) could not finish.')
-            tri.append([rem[(k-1)%m], rem[k], rem[(k+1)%m]])
-            rem.pop(k)
-        tri.append(rem)
+        remaining = n
+        k = 0
+        stall = 0
+        while remaining > 3:
+            if is_ear(k):
+                a = prev[k]
+                clip(k)
+                remaining -= 1
+                k = a
+                stall = 0
+                continue
+            k = next[k]
+            stall += 1
+            if stall > remaining:
+                # No proper ear (degenerate polygon), clip the most convex vertex:
+                best, best_cross, q = k, -np.inf, k
+                for _ in range(remaining):
+                    if cross(prev[q], q, next[q]) > best_cross:
+                        best, best_cross = q, cross(prev[q], q, next[q])
+                    q = next[q]
+                k = prev[best]
+                clip(best)
+                remaining -= 1
+                stall = 0
+        tri.append([k, next[k], next[next[k]]])
         return tri
 
 def main():
@@ -63,6 +63,77 @@ def closest_point(p, a, b, c):
     return (lambda_a*a + lambda_b*b + lambda_c*c) / lambda_sum
 
 
+def closest_point_barycentric(p, a, b, c):
+    """Vectorized closest_point: p, a, b, c are arrays of shape (...,3) that 
+    broadcast together. Returns (q, bary) where q is the closest point on 
+    triangle abc and bary its barycentric coordinates (...,3) w.r.t. (a,b,c).
+    Uses the same region tests as closest_point, evaluated with masks.
+    """
+    p, a, b, c = (np.asarray(x, dtype=float) for x in (p, a, b, c))
+    dot = lambda u, v: np.sum(u*v, axis=-1)
+    ab = b - a
+    ac = c - a
+    ap, bp, cp = p - a, p - b, p - c
+    ab_ap, ac_ap = dot(ab, ap), dot(ac, ap)
+    ab_bp, ac_bp = dot(ab, bp), dot(ac, bp)
+    ab_cp, ac_cp = dot(ab, cp), dot(ac, cp)
+    lambda_c = ab_ap*ac_bp - ab_bp*ac_ap
+    lambda_b = ab_cp*ac_ap - ab_ap*ac_cp
+    lambda_a = ab_bp*ac_cp - ab_cp*ac_bp
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Values are only used where the corresponding region is selected.
+        v_ab = ab_ap / (ab_ap - ab_bp)
+        v_ac = ac_ap / (ac_ap - ac_cp)
+        v_bc = (ac_bp-ab_bp) / ((ac_bp-ab_bp) + (ab_cp-ac_cp))
+        lambda_sum = lambda_a + lambda_b + lambda_c
+        # Start from the inside region, then apply the other regions in reverse 
+        # order of priority so that the first matching one wins:
+        u, v, w = lambda_a/lambda_sum, lambda_b/lambda_sum, lambda_c/lambda_sum
+        regions = (
+            ((lambda_a <= 0.0) & ((ac_bp-ab_bp) >= 0.0) & ((ab_cp-ac_cp) >= 0.0), (0.0, 1-v_bc, v_bc)),    # edge bc
+            ((lambda_b <= 0.0) & (ac_ap >= 0.0) & (ac_cp <= 0.0), (1-v_ac, 0.0, v_ac)),                    # edge ac
+            ((lambda_c <= 0.0) & (ab_ap >= 0.0) & (ab_bp <= 0.0), (1-v_ab, v_ab, 0.0)),                    # edge ab
+            ((ac_cp >= 0.0) & (ab_cp <= ac_cp), (0.0, 0.0, 1.0)),                                          # vertex c
+            ((ab_bp >= 0.0) & (ac_bp <= ab_bp), (0.0, 1.0, 0.0)),                                          # vertex b
+            ((ab_ap <= 0.0) & (ac_ap <= 0.0), (1.0, 0.0, 0.0)),                                            # vertex a
+        )
+        for condition, (ru, rv, rw) in regions:
+            u = np.where(condition, ru, u)
+            v = np.where(condition, rv, v)
+            w = np.where(condition, rw, w)
+    bary = np.stack((u, v, w), axis=-1)
+    q = bary[...,0,None]*a + bary[...,1,None]*b + bary[...,2,None]*c
+    return q, bary
+
+def closest_points(points, triangles, chunk_size=1000000):
+    """Finds the closest point on a set of triangles for many query points.
+    points is (N,3) and triangles (M,3,3). Returns (q, d, ids, bary) where 
+    q (N,3) are the closest points, d (N,) the distances, ids (N,) the 
+    triangles realizing them and bary (N,3) barycentric coordinates of q in 
+    those triangles. Points are processed in chunks of about chunk_size pairs.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    triangles = np.asarray(triangles, dtype=float).reshape(-1, 3, 3)
+    n = len(points)
+    q, bary = np.zeros((n, 3)), np.zeros((n, 3))
+    d, ids = np.zeros(n), np.zeros(n, dtype=np.int64)
+    if len(triangles) == 0:
+        raise ValueError("No triangles given.")
+    step = max(1, chunk_size // len(triangles))
+    a, b, c = triangles[None,:,0], triangles[None,:,1], triangles[None,:,2]
+    for start in range(0, n, step):
+        p = points[start:start+step,None,:]
+        q_all, bary_all = closest_point_barycentric(p, a, b, c)
+        d_all = np.linalg.norm(q_all - p, axis=-1)
+        best = np.argmin(d_all, axis=1)
+        rows = np.arange(len(best))
+        q[start:start+step] = q_all[rows,best]
+        bary[start:start+step] = bary_all[rows,best]
+        d[start:start+step] = d_all[rows,best]
+        ids[start:start+step] = best
+    return q, d, ids, bary
+
 # Represents plane defined by (x,y,z): abc.(x,y,z)=d (point-normal form)
 class Plane:
     abc: npt.ArrayLike      # Unit normal of the plane.
@@ -78,20 +149,33 @@ class Plane:
         return f"{self.abc}, {self.d}"
 
     def signed_distance(self, p):
-        return np.dot(self.abc, p) - self.d
+        """Signed distance of a point (3,) or points (...,3).
+        """
+        return np.asarray(p) @ self.abc - self.d
 
     def distance(self, p):
         return np.abs(self.signed_distance(p))
 
     def reflect(self, p):
-        """Reflects a point or a list of points. 
-        TODO write better
+        """Reflects a point (3,), an array of points (...,3) or an iterable of 
+        points. Iterables are returned as lists.
         """
         if isinstance(p, np.ndarray):
-            return p - 2*self.signed_distance(p)*self.abc
+            return p - 2*np.multiply.outer(self.signed_distance(p), self.abc)
         elif isinstance(p, Iterable):
+            p = list(p)
+            if _is_point_list(p):
+                return list(self.reflect(np.array(p, dtype=float)))
             return [self.reflect(q) for q in p]
         return None
+
+    def reflection_matrix(self):
+        """Returns the 4x4 affine matrix of the reflection through the plane.
+        """
+        m = np.eye(4)
+        m[:3,:3] -= 2*np.outer(self.abc, self.abc)
+        m[:3,3] = 2*self.d*self.abc
+        return m
     
     def __repr__(self):
         return f"Plane(abc={self.abc}, d={self.d})"
@@ -111,6 +195,60 @@ class Plane:
         a = np.array([p1.abc, p2.abc, p3.abc])
         b = np.array([p1.d, p2.d, p3.d])
         return np.linalg.solve(a, b)
+
+    @staticmethod
+    def stack(planes):
+        """Returns (abc, d) arrays of shape (N,3), (N,) for a sequence of planes.
+        A single plane gives N=1.
+        """
+        if isinstance(planes, Plane):
+            planes = [planes]
+        abc = np.array([plane.abc for plane in planes], dtype=float).reshape(-1, 3)
+        d = np.array([plane.d for plane in planes], dtype=float)
+        return abc, d
+
+    @staticmethod
+    def intersections(planes1, planes2, planes3):
+        """Stacked intersection: returns (N,3) array of the intersection points 
+        of planes1[k], planes2[k], planes3[k]. Single planes are broadcast.
+        """
+        (abc1, d1), (abc2, d2), (abc3, d3) = (Plane.stack(p) for p in (planes1, planes2, planes3))
+        abc1, abc2, abc3 = np.broadcast_arrays(abc1, abc2, abc3)
+        a = np.stack((abc1, abc2, abc3), axis=1)
+        b = np.stack(np.broadcast_arrays(d1, d2, d3), axis=1)
+        return np.linalg.solve(a, b[...,None])[...,0]
+
+def _is_point_list(p):
+    return len(p) > 0 and all(isinstance(q, np.ndarray) and q.shape == (3,) for q in p)
+
+def reflections_transform(planes):
+    """Composes reflections through planes (applied in the given order) into 
+    a single 4x4 affine matrix.
+    """
+    if isinstance(planes, Plane):
+        planes = [planes]
+    m = np.eye(4)
+    for plane in planes:
+        m = plane.reflection_matrix() @ m
+    return m
+
+def apply_transform(m, points):
+    """Applies 4x4 affine matrix m to a point (3,) or points (...,3).
+    """
+    return np.asarray(points, dtype=float) @ m[:3,:3].T + m[:3,3]
+
+def reflect_points(points, planes):
+    """Reflects points through a chain of planes using one precomposed affine 
+    transform. Points can be an array (...,3) or an iterable of points, in 
+    which case a list is returned.
+    """
+    m = reflections_transform(planes)
+    if isinstance(points, np.ndarray):
+        return apply_transform(m, points)
+    points = list(points)
+    if _is_point_list(points):
+        return list(apply_transform(m, np.array(points)))
+    return [reflect_points(p, planes) for p in points]
     
 # class Polygon3:
 #     @staticmethod 
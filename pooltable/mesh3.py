@@ -3,6 +3,7 @@
 
 import numpy as np
 import numpy.typing as npt
+import itertools, heapq, collections, operator
 from collections.abc import Iterable, Sequence
 from typing import Any
 import geometry2
@@ -10,39 +11,224 @@ import geometry2
 def normalize(p):
     return p / np.linalg.norm(p)
 
+def _row_view(rows):
+    """Views the rows of a 2D integer array as single structured elements 
+    so that they can be sorted and searched lexicographically.
+    """
+    rows = np.ascontiguousarray(rows)
+    dtype = np.dtype([(f"f{k}", rows.dtype) for k in range(rows.shape[1])])
+    return rows.view(dtype).ravel()
+
+class _CellCodes:
+    """Lookup of neighboring grid cells. Cells (rows sorted lexicographically) 
+    are encoded as single int64 values when the per-coordinate ranks fit, 
+    otherwise rows are compared as structured elements (slower).
+    """
+    def __init__(self, cells):
+        self.cells = cells
+        self.values = [np.unique(cells[:,j]) for j in range(cells.shape[1])]
+        sizes = [len(v) for v in self.values]
+        self.scalar = np.sum(np.log2(np.maximum(sizes, 1))) < 62
+        if self.scalar:
+            strides = np.cumprod([1] + sizes[:0:-1])[::-1]
+            # Code contributions and validity of coordinate j shifted by o in (-1,0,1):
+            self.parts = {}
+            for j, values in enumerate(self.values):
+                for o in (-1, 0, 1):
+                    target = cells[:,j] + o
+                    rank = np.minimum(np.searchsorted(values, target), len(values)-1)
+                    self.parts[j, o] = (rank*strides[j], values[rank] == target)
+            self.sorted = self._encode((0,)*cells.shape[1])[0]
+        else:
+            self.sorted = _row_view(cells)
+
+    def _encode(self, offset):
+        code = np.zeros(len(self.cells), dtype=np.int64)
+        valid = np.ones(len(self.cells), dtype=bool)
+        for j, o in enumerate(offset):
+            part, part_valid = self.parts[j, o]
+            code += part
+            valid &= part_valid
+        return code, valid
+
+    def find(self, offset):
+        """Index of the cell at cells+offset for each cell, -1 if not found.
+        """
+        if self.scalar:
+            keys, valid = self._encode(offset)
+        else:
+            keys = _row_view(self.cells + np.array(offset, dtype=np.int64))
+            valid = True
+        neighbor = np.searchsorted(self.sorted, keys)
+        neighbor[neighbor == len(self.cells)] = 0
+        found = valid & (self.sorted[neighbor] == keys)
+        return np.where(found, neighbor, -1)
+
+def _cell_pairs(a, b, order, cell_start):
+    """All pairs (i,j) of points with i in cell a[k] and j in cell b[k] for 
+    each k, where cell c contains points order[cell_start[c]:cell_start[c+1]].
+    """
+    size = np.diff(cell_start)
+    count = size[a]*size[b]
+    k = np.repeat(np.arange(len(a)), count)
+    ramp = np.arange(len(k)) - np.repeat(np.cumsum(count)-count, count)
+    i = order[cell_start[a][k] + ramp // size[b][k]]
+    j = order[cell_start[b][k] + ramp % size[b][k]]
+    return i, j
+
+def weld(points, EPSILON=1.0e-9):
+    """Welds together points that are closer than EPSILON to each other.
+    Returns (unique_points, indexing) where unique_points is an (m,d) array
+    in order of first appearance and indexing is an (n,) array mapping
+    points to unique_points. Closeness is applied transitively.
+
+    Exact duplicates are merged first. The rest are quantized into a grid 
+    with cell size EPSILON, and cells and pairs of neighboring cells are 
+    compared by their bounding boxes: when all points of a cell (or of two 
+    cells) are close they are linked without comparing them pairwise, only 
+    cells that are partly close compare their points. Coincident points 
+    therefore cost O(n log n).
+    """
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    points = points.reshape(n, -1)
+    if n == 0:
+        return points.copy(), np.zeros(0, dtype=np.int64)
+    d = points.shape[1]
+
+    # Distinct points in order of first appearance:
+    _, first, inverse = np.unique(points, axis=0, return_index=True, return_inverse=True)
+    appearance = np.argsort(first)
+    rank = np.empty_like(appearance)
+    rank[appearance] = np.arange(len(appearance))
+    distinct = points[first[appearance]]
+    inverse = rank[inverse.reshape(-1)]
+
+    keys = np.floor(distinct / EPSILON).astype(np.int64)
+    cells, cell_of_point = np.unique(keys, axis=0, return_inverse=True)
+    cell_of_point = cell_of_point.reshape(-1)
+    cell_codes = _CellCodes(cells)      # np.unique returns cells in lexicographic order
+    # Points grouped by cell: cell c contains points order[cell_start[c]:cell_start[c+1]]
+    order = np.argsort(cell_of_point, kind="stable")
+    cell_start = np.searchsorted(cell_of_point[order], np.arange(len(cells)+1))
+    lo = np.minimum.reduceat(distinct[order], cell_start[:-1])
+    hi = np.maximum.reduceat(distinct[order], cell_start[:-1])
+
+    # Links (i,j) between close points, points of a small cell link to its first point:
+    small = np.sum((hi-lo)**2, axis=1) < EPSILON**2
+    in_small = np.nonzero(small[cell_of_point])[0]
+    large = np.nonzero(~small)[0]
+    i, j = _cell_pairs(large, large, order, cell_start)
+    close = np.sum((distinct[i]-distinct[j])**2, axis=1) < EPSILON**2
+    link_i = [in_small, i[close]]
+    link_j = [order[cell_start[cell_of_point[in_small]]], j[close]]
+    # Neighboring cells, each pair once:
+    for offset in itertools.product((-1, 0, 1), repeat=d):
+        if offset <= (0,)*d:
+            continue
+        neighbor = cell_codes.find(offset)
+        a = np.nonzero(neighbor >= 0)[0]
+        b = neighbor[a]
+        far = np.maximum(hi[b]-lo[a], hi[a]-lo[b])
+        near = np.maximum(np.maximum(lo[b]-hi[a], lo[a]-hi[b]), 0.0)
+        all_close = np.sum(far**2, axis=1) < EPSILON**2
+        some_close = ~all_close & (np.sum(near**2, axis=1) < EPSILON**2)
+        # All close implies that both cells are small, so their first points stand for them:
+        link_i.append(order[cell_start[a[all_close]]])
+        link_j.append(order[cell_start[b[all_close]]])
+        i, j = _cell_pairs(a[some_close], b[some_close], order, cell_start)
+        close = np.sum((distinct[i]-distinct[j])**2, axis=1) < EPSILON**2
+        link_i.append(i[close])
+        link_j.append(j[close])
+    link_i = np.concatenate(link_i)
+    link_j = np.concatenate(link_j)
+
+    # Label connected components with their smallest point index:
+    labels = np.arange(len(distinct))
+    while True:
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, link_i, labels[link_j])
+        np.minimum.at(new_labels, link_j, labels[link_i])
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    representatives, indexing = np.unique(labels, return_inverse=True)
+    return distinct[representatives], indexing.reshape(-1)[inverse]
+
 def unique_indexing(points, EPSILON=1.0e-9):
     """Returns list of unique points and indexing from points to the unique points.
+    Points can be given as a list or as a dict, the indexing uses the same keys.
     """
     if isinstance(points, list):
         points = {k: p for k, p in enumerate(points)}
-    u_points = []
-    indexing_p_to_up = {}
-    for key, p in points.items():
-        for uk, up in enumerate(u_points):
-            if np.linalg.norm(up-p) < EPSILON:
-                indexing_p_to_up[key] = uk
-                break
-        else:
-            # p not found in u_points:
-            indexing_p_to_up[key] = len(u_points)
-            u_points.append(p)
-    return (u_points, indexing_p_to_up)
+    keys = list(points.keys())
+    if len(keys) == 0:
+        return ([], {})
+    u_points, indexing = weld([points[key] for key in keys], EPSILON)
+    indexing_p_to_up = dict(zip(keys, indexing.tolist()))
+    return (list(u_points), indexing_p_to_up)
+
+def oriented_bases(points, face_offsets):
+    """Batched version of Face3.oriented_basis for many faces at once. 
+    Face k consists of points[face_offsets[k]:face_offsets[k+1]]. 
+    Returns (b1,b2,b3,p0) where each is an (F,3) array. Faces of the same 
+    size are processed together with a stacked SVD of their covariance matrices.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    face_offsets = np.asarray(face_offsets, dtype=np.int64)
+    sizes = np.diff(face_offsets)
+    b1, b2, b3, p0 = (np.zeros((len(sizes), 3)) for _ in range(4))
+    for size in np.unique(sizes):
+        fks = np.nonzero(sizes == size)[0]
+        pts = points[face_offsets[fks][:,None] + np.arange(size)]     # (f,size,3)
+        centroids = np.mean(pts, axis=1)
+        q = pts - centroids[:,None,:]
+        cov_matrices = np.einsum("fki,fkj->fij", q, q) / max(size-1, 1)
+        basis,_,_ = np.linalg.svd(cov_matrices)
+        u1, u2, u3 = basis[:,:,0], basis[:,:,1], basis[:,:,2]
+        u3 = np.where((np.linalg.det(basis) < 0.0)[:,None], -u3, u3)
+        # Orientation test with the shoelace formula in the (u1,u2) coordinates:
+        x = np.einsum("fki,fi->fk", q, u1)
+        y = np.einsum("fki,fi->fk", q, u2)
+        signed_area = 0.5*np.sum(x*np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1)*y, axis=1)
+        flip = (signed_area < 0.0)[:,None]
+        b1[fks] = np.where(flip, u2, u1)
+        b2[fks] = np.where(flip, u1, u2)
+        b3[fks] = np.where(flip, -u3, u3)
+        p0[fks] = centroids
+    return (b1, b2, b3, p0)
 
 class Face3: 
     """A polygonal face of a 3D mesh. The best fitting plane for the face
     is spanned by self.basis[0] and self.basis[1] and the correctly oriented 
-    normal of the face is self.basis[2].
+    normal of the face is self.basis[2]. The basis is computed on first access.
     """
-    pts: Sequence[np.ndarray]
+    __slots__ = ("pts", "ns", "uvs", "_basis")
+    pts: np.ndarray                 # (n,3)
     ns: Sequence[np.ndarray]
     uvs: Sequence[np.ndarray]
-    basis: Sequence[np.ndarray]     # (b1,b2,b3, p0)
     
-    def __init__(self, pts):
-        self.pts = pts
-        self.ns = len(pts)*[None]
-        self.uvs = len(pts)*[None]
-        self.basis = self.oriented_basis(pts)
+    def __init__(self, pts, basis=None):
+        """The basis can be given if it is already known, for example 
+        when it has been computed for many faces with oriented_bases.
+        """
+        self.pts = np.asarray(pts, dtype=float).reshape(-1, 3)
+        self.ns = len(self.pts)*[None]
+        self.uvs = len(self.pts)*[None]
+        self._basis = basis
+
+    @property
+    def basis(self):
+        """(b1,b2,b3,p0), see oriented_basis.
+        """
+        if self._basis is None:
+            self._basis = self.oriented_basis(self.pts)
+        return self._basis
+
+    @basis.setter
+    def basis(self, basis):
+        self._basis = basis
 
     @property
     def n(self):
@@ -69,23 +255,49 @@ class Face3:
             b1, b2, b3 = b2, b1, -b3
 
         return (b1, b2, b3, p0)
-    
-    def triangulate(self) -> list:
-        """Triangulates the polygon and returns the triangles as a list.
+
+    @classmethod
+    def create_many(cls, pts_list) -> list:
+        """Creates faces from a list of point lists, computing all the 
+        bases in one batch instead of face by face.
+        """
+        pts_list = [np.asarray(pts, dtype=float) for pts in pts_list]
+        if len(pts_list) == 0:
+            return []
+        face_offsets = np.zeros(len(pts_list)+1, dtype=np.int64)
+        face_offsets[1:] = np.cumsum([len(pts) for pts in pts_list])
+        b1, b2, b3, p0 = oriented_bases(np.concatenate(pts_list), face_offsets)
+        return [cls(pts, (b1[k], b2[k], b3[k], p0[k])) for k, pts in enumerate(pts_list)]
+
+    def triangle_indices(self) -> list:
+        """Triangulates the polygon in its best fitting plane and 
+        returns the triangles as index triples.
         """
         if len(self.pts) == 3:
-            return [self]
-        xy = [np.array([np.dot(p-self.basis[3],self.basis[0]), np.dot(p-self.basis[3],self.basis[1])]) for p in self.pts]
-        poly = geometry2.Polygon2(xy)
-        tri = poly.triangulate()
+            return [[0, 1, 2]]
+        xy = (self.pts - self.basis[3]) @ np.array((self.basis[0], self.basis[1])).T
+        return geometry2.Polygon2(xy).triangulate()
+
+    def split(self, tri) -> list:
+        """Returns triangles given by index triples tri as new faces 
+        whose bases are computed lazily. Normals and uvs are copied over from self.
+        """
         faces = []
         for ind in tri:
-            face = Face3(np.array([self.pts[ind[k]] for k in range(3)]))
-            for kp, _ in enumerate(face.pts):
-                face.ns[kp] = self.ns[ind[kp]]
-                face.uvs[kp] = self.uvs[ind[kp]]
+            face = Face3.__new__(Face3)
+            face.pts = self.pts[ind]
+            face.ns = [self.ns[k] for k in ind]
+            face.uvs = [self.uvs[k] for k in ind]
+            face._basis = None
             faces.append(face)
         return faces
+
+    def triangulate(self) -> list:
+        """Triangulates the polygon and returns the triangles as a list.
+        """
+        if len(self.pts) == 3:
+            return [self]
+        return self.split(self.triangle_indices())
     
     def __repr__(self):
         s = f"Face3(n={self.n}"
@@ -93,84 +305,230 @@ class Face3:
             s += f", {p}"
         return s + ")"
     
+def set_bases(faces):
+    """Computes the bases of faces in one batch and stores them in face.basis.
+    """
+    if len(faces) == 0:
+        return
+    face_offsets = np.zeros(len(faces)+1, dtype=np.int64)
+    face_offsets[1:] = np.cumsum([face.n for face in faces])
+    b1, b2, b3, p0 = oriented_bases(np.concatenate([face.pts for face in faces]), face_offsets)
+    for k, face in enumerate(faces):
+        face.basis = (b1[k], b2[k], b3[k], p0[k])
+
+def _csr(keys, n_keys, values):
+    """Groups values by integer keys in 0..n_keys-1, keeping the original order
+    within each group. Returns (offsets, grouped_values) so that values of key k
+    are grouped_values[offsets[k]:offsets[k+1]].
+    """
+    order = np.argsort(keys, kind="stable")
+    offsets = np.zeros(n_keys+1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(keys, minlength=n_keys))
+    return offsets, np.asarray(values)[order]
+
+class MeshAdjacency:
+    """Half-edge adjacency of a polygon mesh stored in flat arrays. Half-edge k
+    is the edge of face he_face[k] starting from corner k, so half-edges share 
+    their indexing with the face corners. Edges are numbered in order of first 
+    appearance. Incidence lists are stored in CSR form (offsets, values).
+    """
+    vertices: np.ndarray        # (V,3) welded positions
+    face_offsets: np.ndarray    # (F+1,)
+    he_origin: np.ndarray       # (C,) vertex where half-edge starts
+    he_target: np.ndarray       # (C,) vertex where half-edge ends
+    he_face: np.ndarray         # (C,)
+    he_next: np.ndarray         # (C,) next half-edge in the same face
+    he_prev: np.ndarray         # (C,)
+    he_edge: np.ndarray         # (C,)
+    he_twin: np.ndarray         # (C,) opposite half-edge if edge has exactly two, -1 otherwise
+    ev: np.ndarray              # (E,2) edge vertices in orientation of first appearance
+
+    def __init__(self, vertices, face_offsets, face_indices):
+        self.vertices = vertices
+        self.face_offsets = np.asarray(face_offsets, dtype=np.int64)
+        face_indices = np.asarray(face_indices, dtype=np.int64)
+        sizes = np.diff(self.face_offsets)
+        n_faces, n_vertices, n_corners = len(sizes), len(vertices), len(face_indices)
+
+        corners = np.arange(n_corners)
+        self.he_face = np.repeat(np.arange(n_faces), sizes)
+        face_start = self.face_offsets[self.he_face]
+        self.he_next = face_start + (corners-face_start+1) % sizes[self.he_face]
+        self.he_prev = face_start + (corners-face_start-1) % sizes[self.he_face]
+        self.he_origin = face_indices
+        self.he_target = face_indices[self.he_next]
+
+        # Edges from unordered vertex pairs, renumbered in order of first appearance:
+        pairs = np.column_stack((np.minimum(self.he_origin, self.he_target), np.maximum(self.he_origin, self.he_target)))
+        if n_corners > 0:
+            _, first, inverse = np.unique(pairs, axis=0, return_index=True, return_inverse=True)
+        else:
+            first, inverse = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        appearance = np.argsort(first)
+        rank = np.empty_like(appearance)
+        rank[appearance] = np.arange(len(appearance))
+        self.he_edge = rank[inverse.reshape(-1)]
+        first = first[appearance]
+        self.ev = np.column_stack((self.he_origin[first], self.he_target[first]))
+        n_edges = len(self.ev)
+
+        self.eh_offsets, self.eh = _csr(self.he_edge, n_edges, corners)
+        self.ef_offsets, self.ef = _csr(self.he_edge, n_edges, self.he_face)
+        self.vf_offsets, self.vf = _csr(face_indices, n_vertices, self.he_face)
+        # Edges of a vertex are listed in order of edge creation:
+        endpoints = self.ev.T.reshape(-1)
+        edge_ids = np.tile(np.arange(n_edges), 2)
+        self.ve_offsets = np.zeros(n_vertices+1, dtype=np.int64)
+        self.ve_offsets[1:] = np.cumsum(np.bincount(endpoints, minlength=n_vertices))
+        self.ve = edge_ids[np.lexsort((edge_ids, endpoints))]
+
+        # Twins for manifold edges:
+        self.he_twin = np.full(n_corners, -1, dtype=np.int64)
+        manifold = np.nonzero(np.diff(self.eh_offsets) == 2)[0]
+        h1, h2 = self.eh[self.eh_offsets[manifold]], self.eh[self.eh_offsets[manifold]+1]
+        self.he_twin[h1] = h2
+        self.he_twin[h2] = h1
+
+    @classmethod
+    def from_faces(cls, faces, EPSILON=1.0e-9):
+        sizes = [face.n for face in faces]
+        face_offsets = np.zeros(len(sizes)+1, dtype=np.int64)
+        face_offsets[1:] = np.cumsum(sizes)
+        if face_offsets[-1] == 0:
+            return cls(np.zeros((0, 3)), face_offsets, np.zeros(0, dtype=np.int64))
+        vertices, face_indices = weld(np.concatenate([np.asarray(face.pts, dtype=float).reshape(-1, 3) for face in faces]), EPSILON)
+        return cls(vertices, face_offsets, face_indices)
+
+    @property
+    def n_vertices(self) -> int:
+        return len(self.vertices)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.ev)
+
+    @property
+    def n_faces(self) -> int:
+        return len(self.face_offsets) - 1
+
+    def face_vertices(self, f: int) -> np.ndarray:
+        return self.he_origin[self.face_offsets[f]:self.face_offsets[f+1]]
+
+    def face_edges(self, f: int) -> np.ndarray:
+        return self.he_edge[self.face_offsets[f]:self.face_offsets[f+1]]
+
+    def vertex_faces(self, v: int) -> np.ndarray:
+        """Faces around vertex v, a face appears once for each of its corners at v.
+        """
+        return self.vf[self.vf_offsets[v]:self.vf_offsets[v+1]]
+
+    def vertex_edges(self, v: int) -> np.ndarray:
+        return self.ve[self.ve_offsets[v]:self.ve_offsets[v+1]]
+
+    def edge_faces(self, e: int) -> np.ndarray:
+        return self.ef[self.ef_offsets[e]:self.ef_offsets[e+1]]
+
+    def edge_half_edges(self, e: int) -> np.ndarray:
+        return self.eh[self.eh_offsets[e]:self.eh_offsets[e+1]]
+
+    def one_ring(self, v: int) -> np.ndarray:
+        """Vertices connected to v by an edge.
+        """
+        ev = self.ev[self.vertex_edges(v)]
+        return np.where(ev[:,0] == v, ev[:,1], ev[:,0])
+
+    def face_neighbors(self, f: int) -> np.ndarray:
+        """Faces sharing an edge with face f.
+        """
+        neighbors = [self.edge_faces(e) for e in self.face_edges(f)]
+        neighbors = np.concatenate(neighbors) if neighbors else np.zeros(0, dtype=np.int64)
+        return np.unique(neighbors[neighbors != f])
+
+    @property
+    def edge_face_counts(self) -> np.ndarray:
+        return np.diff(self.ef_offsets)
+
+    @property
+    def boundary_edges(self) -> np.ndarray:
+        """Edges with exactly one face.
+        """
+        return np.nonzero(self.edge_face_counts == 1)[0]
+
+    @property
+    def boundary_vertices(self) -> np.ndarray:
+        return np.unique(self.ev[self.boundary_edges])
+
+    def is_boundary_vertex(self, v: int) -> bool:
+        return bool(np.any(self.edge_face_counts[self.vertex_edges(v)] == 1))
+
+    def split(self, offsets, values) -> list:
+        """Converts CSR arrays into a list of lists.
+        """
+        values = values.tolist()
+        offsets = offsets.tolist()
+        return [values[offsets[k]:offsets[k+1]] for k in range(len(offsets)-1)]
+
 class Mesh3:
     fs: Sequence[Face3]
 
     def __init__(self):
         self.fs = []
+        self._adjacency = None
+        self._adjacency_faces = ()
 
     def add_face(self, face: Face3):
         self.fs.append(face)
+        self._adjacency = None
+
+    def adjacency(self) -> MeshAdjacency:
+        """Returns the adjacency structure of the mesh. It is built once and 
+        cached until the faces change. The cache remembers the face objects it 
+        was built from, so adding, removing or replacing faces in self.fs is 
+        detected. If the points of a face are modified in place, call invalidate().
+        """
+        if (self._adjacency is None or len(self._adjacency_faces) != len(self.fs)
+                or not all(map(operator.is_, self._adjacency_faces, self.fs))):
+            self._adjacency = MeshAdjacency.from_faces(self.fs)
+            self._adjacency_faces = tuple(self.fs)
+        return self._adjacency
+
+    def invalidate(self):
+        self._adjacency = None
 
     def mesh_indexing(self):
-        # Indexes: 
-        # f->v (face def), f->e, 
-        # e->f, e->v (edge def), 
-        # v->f, v->e
-        # ---
-        # vertices = list of unique pts
-        # fv = just pick matching index from vertices
-        # vf = fill vf by going through fv and storing each
-        # edges = list of unique vertex pairs (from faces) in form k1*vn+k2 (k1=min,k2=max)
-        # ev = trivial
-        # ve = inverse fill from ev
-        # fe = directly from face
-        # ef = filling inverses again by looping through fe and storing inverses
-
-        # vertices:
-        vertices, indexing_p_to_up = unique_indexing({(fk, pk): p for fk, face in enumerate(self.fs) for pk, p in enumerate(face.pts)})
-        vn = len(vertices)
-        # fv, vf:
-        fv = [[] for face in self.fs]
-        vf = [[] for p in vertices]
-        for kf, face in enumerate(self.fs):
-            for kp, p in enumerate(face.pts):
-                u_index = indexing_p_to_up[(kf,kp)]
-                fv[kf].append(u_index)
-                vf[u_index].append(kf)
-        # edges, ev, ve:
-        edges = {}
-        ev = []
-        ve = [[] for p in vertices]
-        fe = [[] for face in self.fs]
-        en = 0
-        for kf, face in enumerate(self.fs):
-            for kp, p in enumerate(face.pts):
-                kp1 = (kp+1) % face.n
-                fv0 = fv[kf][kp]
-                fv1 = fv[kf][kp1]
-                e_index = min(fv0, fv1)*vn + max(fv0, fv1)
-                if e_index not in edges:
-                    edges[e_index] = en
-                    ev.append((fv0, fv1))
-                    ve[fv0].append(en)
-                    ve[fv1].append(en)
-                    en += 1
-                fe[kf].append(edges[e_index])
-        # ef:
-        ef = [[] for e in edges]
-        for kf, face in enumerate(self.fs):
-            for kp, p in enumerate(face.pts):
-                ef[fe[kf][kp]].append(kf)
-        
+        """Returns incidence lists for vertices (v), edges (e) and faces (f) 
+        as lists of lists, for example vf[k] lists the faces of vertex k.
+        """
+        adjacency = self.adjacency()
         mesh_indexing = {}
         mesh_indexing["f"] = self.fs
-        mesh_indexing["v"] = vertices
-        # mesh_indexing["e"] = edges
-        mesh_indexing["ve"] = ve
-        mesh_indexing["vf"] = vf
-        mesh_indexing["ev"] = ev
-        mesh_indexing["fv"] = fv
-        mesh_indexing["ef"] = ef
-        mesh_indexing["fe"] = fe
+        mesh_indexing["v"] = list(adjacency.vertices)
+        mesh_indexing["ve"] = adjacency.split(adjacency.ve_offsets, adjacency.ve)
+        mesh_indexing["vf"] = adjacency.split(adjacency.vf_offsets, adjacency.vf)
+        mesh_indexing["ev"] = [tuple(e) for e in adjacency.ev.tolist()]
+        mesh_indexing["fv"] = adjacency.split(adjacency.face_offsets, adjacency.he_origin)
+        mesh_indexing["ef"] = adjacency.split(adjacency.ef_offsets, adjacency.ef)
+        mesh_indexing["fe"] = adjacency.split(adjacency.face_offsets, adjacency.he_edge)
         return mesh_indexing
     
+    @classmethod
+    def from_polygons(cls, vertices, faces):
+        """Creates a mesh from vertices and faces given as lists of vertex indices.
+        """
+        vertices = np.asarray(vertices, dtype=float).reshape(-1, 3)
+        mesh = Mesh3()
+        mesh.fs = Face3.create_many([vertices[list(face)] for face in faces])
+        return mesh
+
     def triangulate(self):
+        """Returns a mesh where polygons are split into triangles. Triangles are 
+        kept as they are and the bases of new triangles are computed lazily, use 
+        set_bases to compute them in one batch when they are all needed.
+        """
         tri_mesh = Mesh3()
         for face in self.fs:
-            tri_face = face.triangulate()
-            for tri in tri_face:
-                tri_mesh.add_face(tri)
+            for triangle in face.triangulate():
+                tri_mesh.add_face(triangle)
         return tri_mesh
 
     def is_triangle_mesh(self) -> bool:
@@ -203,6 +561,490 @@ class Mesh3:
                 merged.add_face(face)
         return merged
 
+def _corner_array(values, dim):
+    """Stacks per-corner vectors into an (n,dim) array, unset (None) values become nan.
+    """
+    array = np.full((len(values), dim), np.nan)
+    for k, value in enumerate(values):
+        if value is not None:
+            array[k] = value
+    return array
+
+class FaceView3:
+    """A face of a PackedMesh3 with the same interface as Face3. The ns and uvs
+    are views into the arrays of the mesh so writing to them modifies the mesh,
+    pts is gathered from the shared positions.
+    """
+    __slots__ = ("mesh", "index", "_basis")
+
+    def __init__(self, mesh, index: int):
+        self.mesh = mesh
+        self.index = index
+        self._basis = None
+
+    @property
+    def corners(self) -> slice:
+        return slice(self.mesh.face_offsets[self.index], self.mesh.face_offsets[self.index+1])
+
+    @property
+    def n(self):
+        return self.mesh.face_offsets[self.index+1] - self.mesh.face_offsets[self.index]
+
+    @property
+    def pts(self) -> np.ndarray:
+        return self.mesh.positions[self.mesh.face_indices[self.corners]]
+
+    @property
+    def ns(self) -> np.ndarray:
+        return self.mesh.normals[self.corners]
+
+    @property
+    def uvs(self) -> np.ndarray:
+        return self.mesh.uvs[self.corners]
+
+    @property
+    def basis(self):
+        if self._basis is None:
+            self._basis = Face3.oriented_basis(self.pts)
+        return self._basis
+
+    triangle_indices = Face3.triangle_indices
+
+    def __repr__(self):
+        s = f"FaceView3(index={self.index}, n={self.n}"
+        for p in self.pts:
+            s += f", {p}"
+        return s + ")"
+
+class PackedMesh3:
+    """A mesh stored as contiguous arrays (struct-of-arrays). Face k consists 
+    of the corners face_offsets[k]:face_offsets[k+1], face_indices maps corners 
+    to positions (CSR layout). Normals and uvs are stored per corner since 
+    faces sharing a vertex can have different normals and uvs there. 
+    Optional face groups (e.g. materials) map a name to a contiguous face 
+    range (start, end).
+    """
+    positions: np.ndarray       # (V,3)
+    face_offsets: np.ndarray    # (F+1,)
+    face_indices: np.ndarray    # (C,)
+    normals: np.ndarray         # (C,3)
+    uvs: np.ndarray             # (C,2)
+    groups: dict                # name -> (start, end)
+
+    def __init__(self, positions, face_offsets, face_indices, normals=None, uvs=None, groups=None):
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        self.face_offsets = np.asarray(face_offsets, dtype=np.int64)
+        self.face_indices = np.asarray(face_indices, dtype=np.int64)
+        corner_count = len(self.face_indices)
+        self.normals = np.full((corner_count, 3), np.nan) if normals is None else np.asarray(normals, dtype=float)
+        self.uvs = np.full((corner_count, 2), np.nan) if uvs is None else np.asarray(uvs, dtype=float)
+        self.groups = {} if groups is None else dict(groups)
+
+    @classmethod
+    def from_mesh(cls, mesh, EPSILON=1.0e-9):
+        """Packs a Mesh3 (or anything with a list of faces in mesh.fs), 
+        welding the face points into shared positions.
+        """
+        sizes = [face.n for face in mesh.fs]
+        face_offsets = np.zeros(len(sizes)+1, dtype=np.int64)
+        face_offsets[1:] = np.cumsum(sizes)
+        if face_offsets[-1] == 0:
+            return cls(np.zeros((0, 3)), face_offsets, np.zeros(0, dtype=np.int64))
+        corner_points = np.concatenate([np.asarray(face.pts, dtype=float).reshape(-1, 3) for face in mesh.fs])
+        positions, face_indices = weld(corner_points, EPSILON)
+        normals = _corner_array([n for face in mesh.fs for n in face.ns], 3)
+        uvs = _corner_array([uv for face in mesh.fs for uv in face.uvs], 2)
+        return cls(positions, face_offsets, face_indices, normals, uvs)
+
+    @classmethod
+    def merge(cls, meshes, names=None):
+        """Concatenates packed meshes, offsetting their vertex and corner indices. 
+        If names is given, mesh k becomes face group names[k] (consecutive meshes 
+        with the same name share a group), otherwise the groups of the meshes are 
+        carried over. Positions are not welded, see weld_positions.
+        """
+        meshes = list(meshes)
+        if not meshes:
+            return cls(np.zeros((0, 3)), np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        vertex_starts = np.cumsum([0] + [len(m.positions) for m in meshes])
+        corner_starts = np.cumsum([0] + [len(m.face_indices) for m in meshes])
+        face_starts = np.cumsum([0] + [m.n_faces for m in meshes])
+        positions = np.concatenate([m.positions for m in meshes])
+        face_indices = np.concatenate([m.face_indices + vertex_starts[k] for k, m in enumerate(meshes)])
+        face_offsets = np.concatenate([[0]] + [m.face_offsets[1:] + corner_starts[k] for k, m in enumerate(meshes)])
+        normals = np.concatenate([m.normals for m in meshes])
+        uvs = np.concatenate([m.uvs for m in meshes])
+
+        groups = {}
+        for k, m in enumerate(meshes):
+            mesh_groups = m.groups.items() if names is None else [(names[k], (0, m.n_faces))]
+            for name, (start, end) in mesh_groups:
+                start, end = start + face_starts[k], end + face_starts[k]
+                if name not in groups:
+                    groups[name] = (int(start), int(end))
+                elif groups[name][1] == start:
+                    groups[name] = (groups[name][0], int(end))
+                else:
+                    raise ValueError(f"Face group {name} is not contiguous.")
+        return cls(positions, face_offsets, face_indices, normals, uvs, groups)
+
+    def weld_positions(self, EPSILON=1.0e-9):
+        """Returns a mesh where positions closer than EPSILON are welded and unused 
+        ones dropped. Corner arrays and groups are shared with this mesh.
+        """
+        positions, face_indices = weld(self.corner_positions, EPSILON)
+        return PackedMesh3(positions, self.face_offsets, face_indices, self.normals, self.uvs, self.groups)
+
+    def to_mesh(self) -> Mesh3:
+        """Unpacks into a Mesh3 with independent Face3 objects.
+        """
+        mesh = Mesh3()
+        corner_positions = self.corner_positions
+        offsets = self.face_offsets
+        faces = Face3.create_many([corner_positions[offsets[k]:offsets[k+1]] for k in range(self.n_faces)])
+        for k, face in enumerate(faces):
+            face.ns = [None if np.isnan(n[0]) else n.copy() for n in self.normals[offsets[k]:offsets[k+1]]]
+            face.uvs = [None if np.isnan(uv[0]) else uv.copy() for uv in self.uvs[offsets[k]:offsets[k+1]]]
+            mesh.add_face(face)
+        return mesh
+
+    @property
+    def n_faces(self) -> int:
+        return len(self.face_offsets) - 1
+
+    @property
+    def face_sizes(self) -> np.ndarray:
+        return np.diff(self.face_offsets)
+
+    @property
+    def corner_faces(self) -> np.ndarray:
+        """Returns the face index of every corner.
+        """
+        return np.repeat(np.arange(self.n_faces), self.face_sizes)
+
+    @property
+    def corner_positions(self) -> np.ndarray:
+        return self.positions[self.face_indices]
+
+    def face(self, index: int) -> FaceView3:
+        return FaceView3(self, index)
+
+    def oriented_bases(self):
+        """Returns (b1,b2,b3,p0) for all faces as (F,3) arrays, see oriented_bases.
+        """
+        return oriented_bases(self.corner_positions, self.face_offsets)
+
+    @property
+    def fs(self) -> list:
+        """Face views in order, for code written against the Mesh3 interface.
+        """
+        return [FaceView3(self, k) for k in range(self.n_faces)]
+
+    def is_triangle_mesh(self) -> bool:
+        return bool(np.all(self.face_sizes == 3))
+
+    def decimate(self, target_faces: int, max_error=np.inf, max_angle=30.0, max_normal_angle=40.0, EPSILON=1.0e-9):
+        """See decimate.
+        """
+        return decimate(self, target_faces, max_error, max_angle, max_normal_angle, EPSILON)
+
+    def optimize_vertex_cache(self, cache_size: int = 32, EPSILON=1.0e-9):
+        """See optimize_vertex_cache.
+        """
+        return optimize_vertex_cache(self, cache_size, EPSILON)
+
+    def __repr__(self):
+        return f"PackedMesh3(#vertices={len(self.positions)}, #faces={self.n_faces}, #corners={len(self.face_indices)}, #groups={len(self.groups)})"
+
+def _unit_normals(triangles):
+    """Unit normals (F,3) of triangles (F,3,3), zero for degenerate ones.
+    """
+    n = np.cross(triangles[:,1]-triangles[:,0], triangles[:,2]-triangles[:,0])
+    length = np.linalg.norm(n, axis=1)
+    return n / np.where(length > 0.0, length, np.inf)[:,None]
+
+def _face_quadrics(positions, faces):
+    """Area weighted plane quadrics (F,4,4) of triangles.
+    """
+    a, b, c = positions[faces[:,0]], positions[faces[:,1]], positions[faces[:,2]]
+    n = np.cross(b-a, c-a)
+    area2 = np.linalg.norm(n, axis=1)
+    n = n / np.where(area2 > 0.0, area2, 1.0)[:,None]
+    plane = np.column_stack((n, -np.sum(n*a, axis=1)))
+    return 0.5*area2[:,None,None] * plane[:,:,None]*plane[:,None,:]
+
+def _boundary_quadrics(positions, faces, edges, edge_faces, weight):
+    """Quadrics (E,4,4) of planes through boundary edges perpendicular to their 
+    faces, keeping boundary vertices close to the original boundary curve.
+    """
+    a, b = positions[edges[:,0]], positions[edges[:,1]]
+    tri = positions[faces[edge_faces]]
+    n = np.cross(tri[:,1]-tri[:,0], tri[:,2]-tri[:,0])
+    m = np.cross(b-a, n)
+    m = m / np.maximum(np.linalg.norm(m, axis=1), 1.0e-300)[:,None]
+    plane = np.column_stack((m, -np.sum(m*a, axis=1)))
+    length2 = np.sum((b-a)**2, axis=1)
+    return weight*length2[:,None,None] * plane[:,:,None]*plane[:,None,:]
+
+def _locked_vertices(mesh, corner_keys):
+    """Vertices that have more than one distinct corner key.
+    """
+    pairs = np.unique(np.column_stack((mesh.face_indices, corner_keys)), axis=0)
+    return np.bincount(pairs[:,0], minlength=len(mesh.positions)) > 1
+
+def decimate(packed, target_faces: int, max_error=np.inf, max_angle=30.0, max_normal_angle=40.0, EPSILON=1.0e-9):
+    """Simplifies a triangle mesh with quadric error metric (Garland-Heckbert) 
+    half-edge collapses until at most target_faces faces remain or the cheapest 
+    collapse costs more than max_error. Vertices on non-manifold edges, 
+    creases, normal/uv seams and face group boundaries are locked: they are 
+    never moved, so seams and materials are preserved. Boundary vertices only 
+    collapse along the boundary and are held to it by extra quadrics. 
+    Collapses that turn a triangle by more than max_angle or leave its corner 
+    normals further than max_normal_angle off its plane are skipped, so shading 
+    stays consistent with the geometry. Returns a new PackedMesh3.
+    """
+    BOUNDARY_WEIGHT = 100.0
+    cos_limit = np.cos(np.radians(max_angle))
+    cos_normal = np.cos(np.radians(max_normal_angle))
+    if not packed.is_triangle_mesh():
+        raise ValueError("Decimation needs a triangle mesh.")
+    mesh = packed.weld_positions(EPSILON)
+    positions = mesh.positions
+    n_vertices = len(positions)
+    faces = mesh.face_indices.reshape(-1, 3).copy()
+    normals = mesh.normals.reshape(-1, 3, 3).copy()
+    uvs = mesh.uvs.reshape(-1, 3, 2).copy()
+
+    # Corner attribute ids, corners with equal ids can be merged:
+    keys = [weld(np.column_stack((np.nan_to_num(x), np.isnan(x).any(axis=1))), EPSILON)[1] for x in (mesh.normals, mesh.uvs)]
+    corner_attrs = np.unique(np.column_stack(keys), axis=0, return_inverse=True)[1].ravel()
+    face_groups = np.zeros(mesh.n_faces, dtype=np.int64)
+    for k, (start, end) in enumerate(mesh.groups.values()):
+        face_groups[start:end] = k + 1
+
+    adjacency = MeshAdjacency(positions, mesh.face_offsets, mesh.face_indices)
+    locked = _locked_vertices(mesh, corner_attrs) | _locked_vertices(mesh, face_groups[mesh.corner_faces])
+    locked[adjacency.ev[adjacency.edge_face_counts > 2].ravel()] = True
+    # Creases, also flat shaded ones without a normal seam:
+    interior = np.nonzero(adjacency.edge_face_counts == 2)[0]
+    face_n = _unit_normals(positions[faces])
+    edge_faces = adjacency.ef[adjacency.ef_offsets[interior][:,None] + np.arange(2)]
+    crease = np.sum(face_n[edge_faces[:,0]]*face_n[edge_faces[:,1]], axis=1) < cos_limit
+    locked[adjacency.ev[interior[crease]].ravel()] = True
+    boundary_edges = adjacency.boundary_edges
+    boundary_ev = adjacency.ev[boundary_edges]
+    # Boundary vertices that are not on a simple boundary curve:
+    boundary_degree = np.bincount(boundary_ev.ravel(), minlength=n_vertices)
+    locked |= (boundary_degree != 0) & (boundary_degree != 2)
+    is_boundary = boundary_degree > 0
+    corner_attrs = corner_attrs.reshape(-1, 3)
+
+    quadrics = np.zeros((n_vertices, 4, 4))
+    face_quadrics = _face_quadrics(positions, faces)
+    for k in range(3):
+        np.add.at(quadrics, faces[:,k], face_quadrics)
+    if len(boundary_edges) > 0:
+        edge_faces = adjacency.ef[adjacency.ef_offsets[boundary_edges]]
+        edge_quadrics = _boundary_quadrics(positions, faces, boundary_ev, edge_faces, BOUNDARY_WEIGHT)
+        for k in range(2):
+            np.add.at(quadrics, boundary_ev[:,k], edge_quadrics)
+
+    vertex_faces = [set(fs) for fs in adjacency.split(adjacency.vf_offsets, adjacency.vf)]
+    alive = np.ones(len(faces), dtype=bool)
+    version = np.zeros(n_vertices, dtype=np.int64)
+    heap = []
+
+    def push(u, v):
+        if not locked[u]:
+            q = np.append(positions[v], 1.0)
+            cost = float(q @ (quadrics[u]+quadrics[v]) @ q)
+            heapq.heappush(heap, (cost, int(u), int(v), version[u], version[v]))
+
+    def neighbors(u):
+        return set(faces[list(vertex_faces[u])].ravel()) - {u}
+
+    for u, v in adjacency.ev:
+        push(u, v)
+        push(v, u)
+
+    n_alive = len(faces)
+    while n_alive > target_faces and heap:
+        cost, u, v, version_u, version_v = heapq.heappop(heap)
+        if version_u != version[u] or version_v != version[v]:
+            continue
+        if cost > max_error:
+            break
+        shared = [f for f in vertex_faces[u] if v in faces[f]]
+        # Boundary vertices move only along boundary edges (one shared face):
+        if len(shared) != (1 if is_boundary[u] else 2):
+            continue
+        if len(vertex_faces[u]) + len(vertex_faces[v]) - 2*len(shared) < 1:
+            continue
+        # Link condition: u and v share exactly the opposite vertices.
+        opposite = set(faces[shared].ravel()) - {u, v}
+        if neighbors(u) & neighbors(v) != opposite:
+            continue
+        # Corners of v in the removed faces must agree, the moved corners inherit them.
+        kv = [int(np.nonzero(faces[f] == v)[0][0]) for f in shared]
+        if corner_attrs[shared[0], kv[0]] != corner_attrs[shared[-1], kv[-1]]:
+            continue
+        f0, k0 = shared[0], kv[0]
+        moved = [f for f in vertex_faces[u] if f not in shared]
+        ku = [int(np.nonzero(faces[f] == u)[0][0]) for f in moved]
+        # Reject collapses that turn a triangle by more than max_angle or 
+        # degenerate it, or leave its corner normals off its plane:
+        tri = positions[faces[moved]]
+        old_n = _unit_normals(tri)
+        tri[np.arange(len(moved)), ku] = positions[v]
+        new_n = _unit_normals(tri)
+        if np.any(np.sum(old_n*new_n, axis=1) < cos_limit):
+            continue
+        old_cos = np.einsum("fkj,fj->fk", normals[moved], old_n)
+        corner_n = normals[moved]
+        corner_n[np.arange(len(moved)), ku] = normals[f0, k0]
+        new_cos = np.einsum("fkj,fj->fk", corner_n, new_n)
+        if np.any(new_cos < np.minimum(old_cos, cos_normal)):
+            continue
+
+        for f in shared:
+            alive[f] = False
+            for w in faces[f]:
+                vertex_faces[w].discard(f)
+        for f, k in zip(moved, ku):
+            faces[f, k] = v
+            normals[f, k] = normals[f0, k0]
+            uvs[f, k] = uvs[f0, k0]
+            corner_attrs[f, k] = corner_attrs[f0, k0]
+            vertex_faces[v].add(f)
+        vertex_faces[u] = set()
+        quadrics[v] += quadrics[u]
+        version[u] += 1
+        version[v] += 1
+        n_alive -= len(shared)
+        for w in neighbors(v):
+            push(v, w)
+            push(w, v)
+
+    # Compact, keeping face order so that groups stay contiguous:
+    kept = np.cumsum(np.concatenate(([0], alive)))
+    groups = { name: (int(kept[start]), int(kept[end])) for name, (start, end) in mesh.groups.items() }
+    face_offsets = 3*np.arange(n_alive+1)
+    result = PackedMesh3(positions, face_offsets, faces[alive].ravel(), 
+            normals[alive].reshape(-1, 3), uvs[alive].reshape(-1, 2), groups)
+    return result.weld_positions(EPSILON)
+
+def cache_miss_ratio(face_indices, cache_size: int = 32) -> float:
+    """Average cache miss ratio (ACMR): vertex transforms per triangle for a 
+    triangle index buffer with a FIFO post-transform cache of cache_size.
+    """
+    face_indices = np.asarray(face_indices).ravel().tolist()
+    if not face_indices:
+        return 0.0
+    cache, in_cache, misses = collections.deque(), set(), 0
+    for v in face_indices:
+        if v not in in_cache:
+            misses += 1
+            cache.append(v)
+            in_cache.add(v)
+            if len(cache) > cache_size:
+                in_cache.discard(cache.popleft())
+    return 3.0*misses / len(face_indices)
+
+def _forsyth_order(triangles, cache_size):
+    """Orders triangles (T,3) for vertex cache locality with Tom Forsyth's 
+    linear-speed algorithm: greedily emit the triangle with the best score, 
+    where vertices score high when recently used and when few of their 
+    triangles remain. Returns the order as an array of triangle indices.
+    """
+    CACHE_DECAY_POWER = 1.5
+    LAST_TRIANGLE_SCORE = 0.75
+    VALENCE_BOOST_SCALE = 2.0
+    VALENCE_BOOST_POWER = 0.5
+    n_triangles = len(triangles)
+    if n_triangles == 0:
+        return np.zeros(0, dtype=np.int64)
+    vertices, local = np.unique(triangles, return_inverse=True)
+    local = local.reshape(-1, 3)
+    vertex_triangles = [[] for _ in range(len(vertices))]
+    for t, tri in enumerate(local.tolist()):
+        for v in tri:
+            vertex_triangles[v].append(t)
+    remaining = [len(ts) for ts in vertex_triangles]
+    cache_position = [-1]*len(vertices)
+
+    def vertex_score(v):
+        if remaining[v] == 0:
+            return -1.0
+        p = cache_position[v]
+        score = 0.0
+        if p >= 0:
+            score = LAST_TRIANGLE_SCORE if p < 3 else (1.0 - (p-3)/(cache_size-3))**CACHE_DECAY_POWER
+        return score + VALENCE_BOOST_SCALE*remaining[v]**(-VALENCE_BOOST_POWER)
+
+    scores = [vertex_score(v) for v in range(len(vertices))]
+    triangle_scores = [scores[a]+scores[b]+scores[c] for a, b, c in local.tolist()]
+    emitted = [False]*n_triangles
+    tris = local.tolist()
+    order, cache = [], []
+    best = int(np.argmax(triangle_scores))
+    next_unemitted = 0
+    while best >= 0:
+        order.append(best)
+        emitted[best] = True
+        for v in tris[best]:
+            vertex_triangles[v].remove(best)
+            remaining[v] -= 1
+        # Move the triangle's vertices to the front of the LRU cache:
+        cache = tris[best] + [v for v in cache if v not in tris[best]]
+        evicted, cache = cache[cache_size:], cache[:cache_size]
+        for v in evicted:
+            cache_position[v] = -1
+        for p, v in enumerate(cache):
+            cache_position[v] = p
+        for v in cache + evicted:
+            new_score = vertex_score(v)
+            delta = new_score - scores[v]
+            scores[v] = new_score
+            for t in vertex_triangles[v]:
+                triangle_scores[t] += delta
+        # Best triangle using a cached vertex, otherwise the next one left:
+        best, best_score = -1, -np.inf
+        for v in cache:
+            for t in vertex_triangles[v]:
+                if triangle_scores[t] > best_score:
+                    best, best_score = t, triangle_scores[t]
+        if best < 0:
+            while next_unemitted < n_triangles and emitted[next_unemitted]:
+                next_unemitted += 1
+            best = next_unemitted if next_unemitted < n_triangles else -1
+    return np.array(order, dtype=np.int64)
+
+def corner_vertices(packed, EPSILON=1.0e-9):
+    """GPU vertex ids of the corners: corners with the same position, normal 
+    and uv share a vertex, as the (v,vt,vn) triples of an OBJ file do.
+    """
+    keys = np.column_stack((packed.face_indices, weld(packed.normals, EPSILON)[1], weld(packed.uvs, EPSILON)[1]))
+    return np.unique(keys, axis=0, return_inverse=True)[1].reshape(-1)
+
+def optimize_vertex_cache(packed, cache_size: int = 32, EPSILON=1.0e-9):
+    """Reorders the triangles of a triangle mesh for post-transform vertex cache 
+    locality of its GPU vertices (see corner_vertices), within each face group 
+    so groups stay contiguous, and renumbers the welded positions in order of 
+    first use. Returns a new PackedMesh3.
+    """
+    if not packed.is_triangle_mesh():
+        raise ValueError("Vertex cache optimization needs a triangle mesh.")
+    mesh = packed.weld_positions(EPSILON)
+    triangles = corner_vertices(mesh, EPSILON).reshape(-1, 3)
+    # Faces between groups form segments of their own:
+    bounds = sorted({0, mesh.n_faces} | {k for group in mesh.groups.values() for k in group})
+    order = np.concatenate([start + _forsyth_order(triangles[start:end], cache_size) 
+            for start, end in zip(bounds[:-1], bounds[1:])] + [np.zeros(0, dtype=np.int64)])
+    corners = (3*order[:,None] + np.arange(3)).ravel()
+    reordered = PackedMesh3(mesh.positions, mesh.face_offsets, mesh.face_indices[corners], 
+            mesh.normals[corners], mesh.uvs[corners], mesh.groups)
+    return reordered.weld_positions(EPSILON)
+
 def main():
     print("Testing Mesh3")
     for k in range(10000):
@@ -30,7 +30,7 @@ def guillotine_pack_fast(W, H, wh_list, DEBUG=False):
     f_scoring = f_scoring_baf
 
     n = wh_list.shape[1]
-    xy_list = np.empty((2,n), dtype=np.int32)
+    xy_list = np.empty((2,n), dtype=wh_list.dtype)
 
     # argsort returns indices that would sort an array
     wh_order = np.argsort(wh_scoring(wh_list))
@@ -91,7 +91,7 @@ def guillotine_pack(W, H, wh_list):
     # (f_scoring_baf, wh_scoring_desca) works better without sorting...??
 
     n = wh_list.shape[1]
-    xy_list = np.empty((2,n), dtype=np.int32)
+    xy_list = np.empty((2,n), dtype=wh_list.dtype)
 
     # argsort returns indices that would sort an array
     wh_order = np.argsort(wh_scoring(wh_list))
@@ -136,77 +136,42 @@ def guillotine_pack(W, H, wh_list):
     return np.vstack([xy_list, wh_list]), np.array(f_list).T
 
 # computes maximal free rectangles after removing rect from free space
+# f_list is a (4,N) array of free rectangles (x,y,w,h), returns the new (4,M) array
 def maxrects_update(f_list, rect):
-    # step 1: (cut by rect:) for each f in f_list divide it into max 4 parts by rect and construct f_list again by these
-    # Throw each new free rectangle obtained by this process into touching_list or separate_list
-    # based on whether it intersects R=rect (when both are considered as closed sets).
+    # step 1: (cut by rect:) divide each f that touches rect into max 4 parts by rect.
+    # Free rects not touching R=rect (when both are considered as closed sets) are kept as they are.
     # NOTE: When converting all coordinates to integers, need to be real careful here
     # (rectangles can touch even with no integer coord overlap.)
-    # [ Maybe with integer coords define f touching R if dist(f,R)<=1. ]
-    touching_list = []  # new free rects g with d(g,R) {=0 for reals, <=1 for integers}
-    mg_list = []        # final free rectangles, contains all new free rects g that are not touching R
-    for f in f_list:
-        x1 = max(f[0], rect[0])
-        x2 = min(f[0]+f[2], rect[0]+rect[2])
-        y1 = max(f[1], rect[1])
-        y2 = min(f[1]+f[3], rect[1]+rect[3])
-        if (x2-x1 < 0) or (y2-y1 < 0):  # Careful here with integers!!
-            # f and rect do not touch:
-            mg_list.append(f)
-            continue
-
-        # part of f left of rect:
-        if rect[0] > f[0]:     # Careful with integers!
-            g1 = (f[0], f[1], min(f[2], rect[0]-f[0]), f[3])
-            touching_list.append(g1)
-
-        # part of f top of rect:
-        if rect[1] > f[1]:
-            g2 = (f[0], f[1], f[2], min(f[3], rect[1]-f[1]))
-            touching_list.append(g2)
-
-        # part of f right of rect:
-        if rect[0]+rect[2] < f[0]+f[2]:
-            x = max(f[0], rect[0]+rect[2])
-            g3 = (x, f[1], f[0]+f[2]-x, f[3])
-            touching_list.append(g3)
-
-        # part of f under rect:
-        if rect[1]+rect[3] < f[1]+f[3]:
-            y = max(f[1], rect[1]+rect[3])
-            g4 = (f[0], y, f[2], f[1]+f[3]-y)
-            touching_list.append(g4)
-
-    """touching_count = len(touching_list)
-    if touching_count > 30:
-        print(f'{touching_count=}')"""
+    x0, y0, x1, y1 = rect[0], rect[1], rect[0]+rect[2], rect[1]+rect[3]
+    fx, fy, fw, fh = f_list
+    separate = (fx > x1) | (fx+fw < x0) | (fy > y1) | (fy+fh < y0)    # Careful here with integers!!
+    # cut in order of x+y like a list sorted for placement, this decides ties later:
+    touching = np.flatnonzero(~separate)
+    touching = touching[np.argsort(fx[touching]+fy[touching], kind="stable")]
+    fx, fy, fw, fh = f_list[:,touching]
+
+    # parts of f left of, top of, right of and under rect, in this order for each f:
+    parts = np.empty((4, len(touching), 4), dtype=f_list.dtype)
+    parts[:,:,0] = (fx, fy, np.minimum(fw, x0-fx), fh)
+    parts[:,:,1] = (fx, fy, fw, np.minimum(fh, y0-fy))
+    x = np.maximum(fx, x1)
+    parts[:,:,2] = (x, fy, fx+fw-x, fh)
+    y = np.maximum(fy, y1)
+    parts[:,:,3] = (fx, y, fw, fy+fh-y)
+    valid = np.empty((len(touching), 4), dtype=bool)
+    valid[:,0], valid[:,1], valid[:,2], valid[:,3] = x0 > fx, y0 > fy, x1 < fx+fw, y1 < fy+fh
+    g = parts[:,valid]      # in order of creation
 
     # step 2: (remove non-maximal:)
-    # Make a new list that has every g_list[k1] that is not fully contained in a g_list[k2] for any k2 > k1.
-    # TODO: PROVE/DISPROVE: only need to consider g2 that are new too.. would make this much faster if true..
-    # well, g1 touches R [i.e. g1\bar\cap R\ne\empty] and g1\subset g2 so g2 touches R..
-    # which means that _IF_ we extend new designation to any g that touches R, then g2 is new too
-    # SO.. need to extend 'newness' a little (important for integers) but this does not matter with random float coords
-    # Fixed: using touching, separate.
-
-    touching_list_removal = np.full((len(touching_list),), False, dtype=bool)
-        # Needed to handle possible case where g1 and g2 are the same rectangle, in which case need to only 1 of them.
-        # touching_list_removal flags touching_list members for deletion (needed because cant delete while iterating.)
-        # Value is set to True if corresponding touching_list member is a subset of another non-flagged touching_list member.
-    for k1, g1 in enumerate(touching_list):
-        for k2, g2 in enumerate(touching_list):
-            if (k1 == k2) or touching_list_removal[k2]:
-                # If g2 is flagged for removal then can't test against it.
-                continue
-            if (g1[0] >= g2[0]) and (g1[1] >= g2[1]) and (g1[0]+g1[2] <= g2[0]+g2[2]) and (g1[1]+g1[3] <= g2[1]+g2[3]):
-                # g1\subset g2:
-                touching_list_removal[k1] = True
-                break
-        else:
-            # else clause in for-loop is executed when loop completes normally (without break)
-            mg_list.append(g1)
+    # A new rect contained in an old one would make the old one touch R, so only the new
+    # rects need to be compared with each other. Of identical rects the last one is kept.
+    gx, gy, gx2, gy2 = g[0], g[1], g[0]+g[2], g[1]+g[3]
+    contained = (gx[:,None] >= gx) & (gy[:,None] >= gy) & (gx2[:,None] <= gx2) & (gy2[:,None] <= gy2)
+    equal = contained & contained.T
+    ramp = np.arange(len(gx))
+    removed = (contained & ~equal).any(axis=1) | (equal & (ramp > ramp[:,None])).any(axis=1)
 
-    return mg_list
+    return np.concatenate((f_list[:,separate], g[:,~removed]), axis=1)
 
 def intersection(f1, f2):
     x1 = max(f1[0], f2[0])
@@ -279,29 +244,77 @@ def maxrects_pack(W, H, wh_list, DEBUG=False):
     # wh_list in order of descending rectangle_score:
     #wh_sorted = wh_list[:,wh_order]
 
-    # list of empty rectangles:
-    f_list = [(0,0,W,H)]
+    # empty rectangles as columns (x,y,w,h):
+    f_list = np.array([[0],[0],[W],[H]], dtype=wh_list.dtype)
 
     for k in range(n):
         wh = wh_list[:,wh_order[k]]
-        f_list = sorted(f_list, key=lambda f: f[0]+f[1])
+        # place wh in the fitting free rect with smallest x+y (first one on ties):
+        fits = np.flatnonzero((wh[0] <= f_list[2]) & (wh[1] <= f_list[3]))
+        if len(fits) == 0:
+            return None, None
+        f = f_list[:,fits[np.argmin(f_list[0,fits]+f_list[1,fits])]]
+        xy = f[0:2]
+        rect = (xy[0], xy[1], wh[0], wh[1])
+        f_list = maxrects_update(f_list, rect)
+        xy_list[:,wh_order[k]] = xy
 
-        for f in f_list:
-            if (wh[0] <= f[2]) and (wh[1] <= f[3]):
-                # wh fits in f, place it there:
-                xy = f[0:2]
-                rect = (xy[0], xy[1], wh[0], wh[1])
-                f_list = maxrects_update(f_list, rect)
-                xy_list[:,wh_order[k]] = xy
-                break
-        else:
+        if (DEBUG) and (k % 100 == 0):
+            print(f'{k}: |F|={f_list.shape[1]}')
+
+    return np.vstack([xy_list, wh_list]), f_list
+
+# skyline bottom-left: the packed area is bounded from above by a skyline of
+# horizontal segments (x,y), each rect is placed on the skyline where its top is lowest.
+# Space left below the skyline is lost but each placement is cheap.
+# Returns the packing and the free rects above the skyline segments.
+def skyline_pack(W, H, wh_list, DEBUG=False):
+    n = wh_list.shape[1]
+
+    wh_scoring_h = lambda wh: -wh[1]   # descending height
+
+    xy_list = np.empty((2,n), dtype=wh_list.dtype)
+    # descending height, ties by descending width:
+    wh_order = np.lexsort((-wh_list[0], wh_scoring_h(wh_list)))
+
+    # skyline segments from xs[k] to xs[k+1] (last one to W) at height ys[k]:
+    xs = np.zeros(1, dtype=wh_list.dtype)
+    ys = np.zeros(1, dtype=wh_list.dtype)
+
+    for k in range(n):
+        wh = wh_list[:,wh_order[k]]
+        # rect with left side at xs[i] rests on the highest segment under it:
+        ends = np.append(xs[1:], W)
+        right = xs + wh[0]
+        under = (xs >= xs[:,None]) & (xs < right[:,None])
+        y = np.max(np.where(under, ys, ys.min()), axis=1)
+        fits = np.flatnonzero((right <= W) & (y+wh[1] <= H))
+        if len(fits) == 0:
             return None, None
+        i = fits[np.lexsort((xs[fits], y[fits]+wh[1]))[0]]
+        xy_list[:,wh_order[k]] = (xs[i], y[i])
+
+        # replace the skyline under the rect by its top:
+        after = np.flatnonzero(ends > right[i])
+        j = after[0] if len(after) > 0 else len(xs)     # first segment reaching past the rect
+        xs = np.concatenate((xs[:i], [xs[i]], [right[i]] if j < len(xs) else [], xs[j+1:]))
+        ys = np.concatenate((ys[:i], [y[i]+wh[1]], ys[j:j+1], ys[j+1:]))
+        # merge neighbors at the same height:
+        keep = np.concatenate(([True], ys[1:] != ys[:-1]))
+        xs, ys = xs[keep], ys[keep]
 
-        f_list = maxrects_prune(f_list, 3000)
         if (DEBUG) and (k % 100 == 0):
-            print(f'{k}: |F|={len(f_list)}')
+            print(f'{k}: |skyline|={len(xs)}')
 
-    return np.vstack([xy_list, wh_list]), np.array(f_list).T
+    ws = np.append(xs[1:], W) - xs
+    f_list = np.array([xs, ys, ws, H-ys], dtype=wh_list.dtype)
+    return np.vstack([xy_list, wh_list]), f_list
+
+PACKING_STRATEGIES = {
+    "maxrects": maxrects_pack,
+    "skyline": skyline_pack,
+    "guillotine": guillotine_pack_fast,
+}
 
 def cdf(t, inverse=False):
     # t is in [-1,1]
@@ -363,8 +376,12 @@ def generate_samples(n, A, WH0):
     return samples
 
 # testing multiple (W,H) to find a small atlas
-def pack(wh_list, verbose=False):
+# strategy is a key of PACKING_STRATEGIES
+def pack(wh_list, verbose=False, strategy="maxrects"):
     start_time = time.perf_counter()
+    if strategy not in PACKING_STRATEGIES:
+        raise ValueError(f"Unknown packing strategy {strategy}.")
+    pack_function = PACKING_STRATEGIES[strategy]
 
     C1 = 1.0001  # error tolerance for A
     SN = 8     # number of samples to test until we give up on A
@@ -388,8 +405,7 @@ def pack(wh_list, verbose=False):
         samples = generate_samples(SN, A, WH0)
         #print(f'{   samples=}')
         for WH in samples.T:
-            packing = maxrects_pack(WH[0], WH[1], wh_list)
-            #packing = guillotine_pack_fast(WH[0], WH[1], wh_list)
+            packing = pack_function(WH[0], WH[1], wh_list)
             pack_count += 1
             if packing[0] is not None:
                 # packing found:
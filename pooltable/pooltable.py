@@ -8,18 +8,36 @@
 
 # Creates files:
 #   - pooltable.json: measurements of a pooltable and their explanations
+#   - pooltable.mtl - materials
 #   - cushions.obj - cushions
-#   - slate.obj - slate
-#   - liners.obj - pocket liners
-#   - rails.obj - rails
-#   - casing.obj - casing
+#   - pooltable.obj - slate, rails, rail sights, pocket liners and casing
+#   - pooltable_lod1.obj, pooltable_lod2.obj - simplified versions of pooltable.obj
+#   - *.tangents.bin - tangents for the .obj files, see pooltable_tangents
+#   - atlas.jpg - uv texture, atlas.json with resolution tiers and mipmaps, see pooltable_mipmaps
+#   - diagnostics.json - mesh checks, see pooltable_diagnostics
+# Source textures are read from POOLTABLE_ASSET_DIR, see pooltable_textures
 
 import json, pickle
 import numpy as np
-import pooltable_specs, pooltable_geometry, pooltable_normals, pooltable_uv
+import pooltable_specs, pooltable_geometry, pooltable_normals, pooltable_uv, pooltable_diagnostics, pooltable_tangents
 import mesh3
 import time
 
+# Limits (max_angle, max_normal_angle) in degrees of mesh3.decimate for
+# pooltable_lod1.obj, pooltable_lod2.obj, ...: larger angles simplify more.
+LOD_ANGLES = ((30.0, 40.0), (45.0, 60.0))
+
+def levels_of_detail(packed, angles=LOD_ANGLES):
+    """Decimates packed as far as each of the angle limits allows. Levels 
+    that do not have fewer faces than the previous one are left out.
+    """
+    lods = []
+    for max_angle, max_normal_angle in angles:
+        lod = packed.decimate(0, max_angle=max_angle, max_normal_angle=max_normal_angle)
+        if lod.n_faces < (lods[-1] if lods else packed).n_faces:
+            lods.append(lod)
+    return lods
+
 def convert_numpy_to_lists(obj):
     """Converts numpy ndarray objects to lists so that they can be serialized.
     """
@@ -48,58 +66,52 @@ def write_mtl_file(data, file_name):
             file.write("map_Kd atlas.jpg\n\n")
     print(f"File {file_name} written.")
 
-def write_obj_file(mesh, file_name, name):
-    vertices = {(fk, pk): p for fk, face in enumerate(mesh.fs) for pk, p in enumerate(face.pts)}
-    unique_vertices, indexing_vertices = mesh3.unique_indexing(vertices)
-    normals = {(fk, nk): n for fk, face in enumerate(mesh.fs) for nk, n in enumerate(face.ns)}
-    unique_normals, indexing_normals = mesh3.unique_indexing(normals)
-    uvs = {(fk, k): uv for fk, face in enumerate(mesh.fs) for k, uv in enumerate(face.uvs)}
-    unique_uvs, indexing_uvs = mesh3.unique_indexing(uvs)
-
-    with open(file_name, "w") as file:
-        file.write(f"mtllib pooltable.mtl\n")
-        for v in unique_vertices:
-            file.write(f"v {v[0]} {v[1]} {v[2]}\n")
-        for v in unique_normals:
-            file.write(f"vn {v[0]} {v[1]} {v[2]}\n")
-        for v in unique_uvs:
-            file.write(f"vt {v[0]} {v[1]}\n")
-        file.write(f"usemtl material_{name}\n")
-        for fk, face in enumerate(mesh.fs):
-            s = "f "
-            for vk, v in enumerate(face.pts):
-                s += f"{indexing_vertices[(fk,vk)]+1}/{indexing_uvs[(fk,vk)]+1}/{indexing_normals[(fk,vk)]+1} "
-            file.write(s + "\n")
-    print(f"File {file_name} written.")
-
-def write_merged_obj_file(file_name, mesh, face_to_name):
-    vertices = {(fk, pk): p for fk, face in enumerate(mesh.fs) for pk, p in enumerate(face.pts)}
-    unique_vertices, indexing_vertices = mesh3.unique_indexing(vertices)
-    normals = {(fk, nk): n for fk, face in enumerate(mesh.fs) for nk, n in enumerate(face.ns)}
-    unique_normals, indexing_normals = mesh3.unique_indexing(normals)
-    uvs = {(fk, k): uv for fk, face in enumerate(mesh.fs) for k, uv in enumerate(face.uvs)}
-    unique_uvs, indexing_uvs = mesh3.unique_indexing(uvs)
+def obj_indexing(packed):
+    """Welds the corner normals and uvs of a packed mesh for an OBJ file. 
+    Returns (unique_normals, normal_indexing, unique_uvs, uv_indexing).
+    """
+    unique_normals, indexing_normals = mesh3.weld(packed.normals)
+    unique_uvs, indexing_uvs = mesh3.weld(packed.uvs)
+    return unique_normals, indexing_normals, unique_uvs, indexing_uvs
+
+def write_obj_header(file, packed, unique_normals, unique_uvs):
+    file.write(f"mtllib pooltable.mtl\n")
+    for v in packed.positions:
+        file.write(f"v {v[0]} {v[1]} {v[2]}\n")
+    for v in unique_normals:
+        file.write(f"vn {v[0]} {v[1]} {v[2]}\n")
+    for v in unique_uvs:
+        file.write(f"vt {v[0]} {v[1]}\n")
+
+def write_obj_faces(file, packed, face_indices, indexing_normals, indexing_uvs):
+    # OBJ indices start from 1:
+    v_list = (packed.face_indices+1).tolist()
+    vt_list = (indexing_uvs+1).tolist()
+    vn_list = (indexing_normals+1).tolist()
+    offsets = packed.face_offsets.tolist()
+    for fk in face_indices:
+        s = "f "
+        for c in range(offsets[fk], offsets[fk+1]):
+            s += f"{v_list[c]}/{vt_list[c]}/{vn_list[c]} "
+        file.write(s + "\n")
+
+def write_obj_file(packed, file_name):
+    """Writes a packed mesh into an OBJ file with one usemtl block per face group.
+    """
+    unique_normals, indexing_normals, unique_uvs, indexing_uvs = obj_indexing(packed)
 
     with open(file_name, "w") as file:
-        file.write(f"mtllib pooltable.mtl\n")
-        for v in unique_vertices:
-            file.write(f"v {v[0]} {v[1]} {v[2]}\n")
-        for v in unique_normals:
-            file.write(f"vn {v[0]} {v[1]} {v[2]}\n")
-        for v in unique_uvs:
-            file.write(f"vt {v[0]} {v[1]}\n")
-
-        for name in ("cushions", "slate", "rails", "rail_sights", "liners", "casing"):
+        write_obj_header(file, packed, unique_normals, unique_uvs)
+        for name, (start, end) in packed.groups.items():
             file.write(f"usemtl material_{name}\n")
-            for fk, face in enumerate(mesh.fs):
-                if face_to_name[face] != name:
-                    continue
-                s = "f "
-                for vk, v in enumerate(face.pts):
-                    s += f"{indexing_vertices[(fk,vk)]+1}/{indexing_uvs[(fk,vk)]+1}/{indexing_normals[(fk,vk)]+1} "
-                file.write(s + "\n")
+            write_obj_faces(file, packed, range(start, end), indexing_normals, indexing_uvs)
     print(f"File {file_name} written.")
 
+def write_model(packed, base_name):
+    """Writes base_name.obj and its tangents into base_name.tangents.bin.
+    """
+    write_obj_file(packed, f"{base_name}.obj")
+    pooltable_tangents.write_tangents_file(packed, f"{base_name}.tangents.bin")
 
 def run():
     start_time = time.perf_counter()
@@ -108,6 +120,9 @@ def run():
     data = pooltable_normals.run(data)
     data = pooltable_uv.run(data)
 
+    # Check the polygons before triangulation, which would hide non-planar faces:
+    pooltable_diagnostics.run(data, "obj/diagnostics.json")
+
     # Triangulate everything
     for name in ("cushions", "slate", "rails", "rail_sights", "liners", "casing"):
         for key, mesh in data[name].items():
@@ -124,18 +139,24 @@ def run():
 
         # Write pooltable model to file:
         write_mtl_file(data, "obj/pooltable.mtl")
-        face_to_name = {}
-        merged_all = []
-        for name in ("cushions", "slate", "liners", "casing", "rails", "rail_sights"):
-            merged_mesh = mesh3.Mesh3.merge(data[name].values())
-            for face in merged_mesh.fs:
-                face_to_name[face] = name
-            if name == "cushions":
-                write_obj_file(merged_mesh, f"obj/{name}.obj", name)
-            else:
-                merged_all.append(merged_mesh)
-        merged_all = mesh3.Mesh3.merge(merged_all)
-        write_merged_obj_file(f"obj/pooltable.obj", merged_all, face_to_name)
+        packed = {}
+        for name in ("cushions", "slate", "rails", "rail_sights", "liners", "casing"):
+            meshes = [mesh3.PackedMesh3.from_mesh(mesh) for mesh in data[name].values()]
+            packed[name] = mesh3.PackedMesh3.merge(meshes, [name]*len(meshes))
+        # Triangles are reordered for the GPU vertex cache before writing, 
+        # which also numbers vertices in order of first use. Each model gets 
+        # its tangents in a .tangents.bin file next to it.
+        write_model(packed["cushions"].optimize_vertex_cache(), "obj/cushions")
+        # Groups are concatenated in material order so each is written in one block:
+        merged_all = mesh3.PackedMesh3.merge(packed[name] for name in ("slate", "rails", "rail_sights", "liners", "casing"))
+        merged_all = merged_all.weld_positions()
+        write_model(merged_all.optimize_vertex_cache(), "obj/pooltable")
+
+        # Levels of detail for clients that do not need the full mesh. Seams, 
+        # creases and material boundaries are locked, so the angle limits 
+        # decide how far each level gets:
+        for k, lod in enumerate(levels_of_detail(merged_all), start=1):
+            write_model(lod.optimize_vertex_cache(), f"obj/pooltable_lod{k}")
 
     print(f"Done after {time.perf_counter() - start_time:.2f} sec.")
 
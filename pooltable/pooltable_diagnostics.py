@@ -0,0 +1,183 @@
+"""Vectorized checks for the generated meshes. For every mesh in the pipeline
+data a small report is computed: planarity of polygons, degenerate and sliver
+triangles, non-manifold and boundary edges, duplicate faces and faces whose
+orientation disagrees with their neighbors. The reports are written as JSON.
+"""
+
+import json
+import numpy as np
+import mesh3
+
+# Relative distance of polygon points from their best-fit plane:
+PLANARITY_TOLERANCE = 1.0e-9
+# Triangles with area below this times the longest edge squared are degenerate:
+DEGENERATE_TOLERANCE = 1.0e-12
+# Triangle quality 4*sqrt(3)*area/(sum of squared edge lengths) is 1 for
+# equilateral triangles, below this the triangle counts as a sliver:
+SLIVER_QUALITY = 0.05
+
+def planarity_errors(packed):
+    """Returns relative planarity errors (F,): largest distance of a face point
+    from the face plane divided by the largest distance from the centroid.
+    """
+    if packed.n_faces == 0:
+        return np.zeros(0)
+    _, _, normals, centroids = packed.oriented_bases()
+    corner_faces = packed.corner_faces
+    q = packed.corner_positions - centroids[corner_faces]
+    height = np.abs(np.sum(q*normals[corner_faces], axis=1))
+    radius = np.linalg.norm(q, axis=1)
+    starts = packed.face_offsets[:-1]
+    max_height = np.maximum.reduceat(height, starts)
+    max_radius = np.maximum.reduceat(radius, starts)
+    return max_height / np.where(max_radius > 0.0, max_radius, 1.0)
+
+def triangle_qualities(packed):
+    """Returns (triangle_faces, areas, qualities, longest_edges2) for the faces
+    of the mesh that are triangles.
+    """
+    triangle_faces = np.nonzero(packed.face_sizes == 3)[0]
+    corners = packed.face_offsets[triangle_faces][:,None] + np.arange(3)
+    tri = packed.positions[packed.face_indices[corners]]
+    areas = 0.5*np.linalg.norm(np.cross(tri[:,1]-tri[:,0], tri[:,2]-tri[:,0]), axis=1)
+    edges2 = np.sum((np.roll(tri, -1, axis=1) - tri)**2, axis=2)
+    sum_edges2 = np.sum(edges2, axis=1)
+    qualities = 4.0*np.sqrt(3.0)*areas / np.where(sum_edges2 > 0.0, sum_edges2, 1.0)
+    return triangle_faces, areas, qualities, np.max(edges2, axis=1, initial=0.0)
+
+def duplicate_faces(packed):
+    """Faces using the same set of vertices as an earlier face.
+    """
+    if packed.n_faces == 0:
+        return np.zeros(0, dtype=np.int64)
+    sizes = packed.face_sizes
+    rows = np.full((packed.n_faces, np.max(sizes)), -1, dtype=np.int64)
+    ramp = np.arange(len(packed.face_indices)) - np.repeat(packed.face_offsets[:-1], sizes)
+    rows[packed.corner_faces, ramp] = packed.face_indices
+    rows = np.sort(rows, axis=1)
+    _, first = np.unique(rows, axis=0, return_index=True)
+    duplicate = np.ones(packed.n_faces, dtype=bool)
+    duplicate[first] = False
+    return np.nonzero(duplicate)[0]
+
+def pack_meshes(meshes, EPSILON=1.0e-9):
+    """Packs several meshes into one PackedMesh3 with face group k for mesh k. 
+    Points are welded once for all meshes but vertices are not shared between 
+    meshes: mesh k uses the vertices vertex_starts[k]:vertex_starts[k+1] in 
+    order of first appearance. Returns (packed, vertex_starts).
+    """
+    corner_points, sizes = [], []
+    for mesh in meshes:
+        if isinstance(mesh, mesh3.PackedMesh3):
+            corner_points.append(mesh.corner_positions)
+            sizes.append(mesh.face_sizes)
+        else:
+            corner_points.extend(np.asarray(face.pts, dtype=float).reshape(-1, 3) for face in mesh.fs)
+            sizes.append(np.array([face.n for face in mesh.fs], dtype=np.int64))
+    face_starts = np.cumsum([0] + [len(s) for s in sizes])
+    groups = { k: (int(face_starts[k]), int(face_starts[k+1])) for k in range(len(sizes)) }
+    sizes = np.concatenate(sizes) if sizes else np.zeros(0, dtype=np.int64)
+    face_offsets = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+    if face_offsets[-1] == 0:
+        packed = mesh3.PackedMesh3(np.zeros((0, 3)), face_offsets, np.zeros(0, dtype=np.int64), groups=groups)
+        return packed, np.zeros(len(groups)+1, dtype=np.int64)
+
+    corner_points = np.concatenate(corner_points)
+    _, welded = mesh3.weld(corner_points, EPSILON)
+    corner_mesh = np.repeat(np.arange(len(groups)), np.diff(face_offsets[face_starts]))
+    # Separate the vertices of different meshes and number them by first corner:
+    _, first, inverse = np.unique(np.column_stack((corner_mesh, welded)), axis=0, return_index=True, return_inverse=True)
+    appearance = np.argsort(first)
+    rank = np.empty_like(appearance)
+    rank[appearance] = np.arange(len(appearance))
+    positions = corner_points[first[appearance]]
+    vertex_starts = np.searchsorted(corner_mesh[first[appearance]], np.arange(len(groups)+1))
+    packed = mesh3.PackedMesh3(positions, face_offsets, rank[inverse.reshape(-1)], groups=groups)
+    return packed, vertex_starts
+
+def mesh_reports(meshes, EPSILON=1.0e-9):
+    """Computes the reports (dicts) of Mesh3 or PackedMesh3 objects in one 
+    vectorized pass over all of them. Indices refer to the faces of each mesh 
+    and to its welded vertices.
+    """
+    meshes = list(meshes)
+    n = len(meshes)
+    packed, vertex_starts = pack_meshes(meshes, EPSILON)
+    adjacency = mesh3.MeshAdjacency(packed.positions, packed.face_offsets, packed.face_indices)
+    face_starts = np.array([start for start, _ in packed.groups.values()] + [packed.n_faces], dtype=np.int64)
+    face_mesh = lambda f: np.searchsorted(face_starts, f, side="right") - 1
+
+    planarity = planarity_errors(packed)
+    non_planar = np.nonzero((packed.face_sizes > 3) & (planarity > PLANARITY_TOLERANCE))[0]
+    triangle_faces, areas, qualities, longest_edges2 = triangle_qualities(packed)
+    degenerate = areas <= DEGENERATE_TOLERANCE*longest_edges2
+    sliver = ~degenerate & (qualities < SLIVER_QUALITY)
+    counts = adjacency.edge_face_counts
+    # Neighbors sharing an edge should traverse it in opposite directions:
+    manifold = np.nonzero(counts == 2)[0]
+    h1, h2 = adjacency.eh[adjacency.eh_offsets[manifold]], adjacency.eh[adjacency.eh_offsets[manifold]+1]
+    face_sets = {
+        "non_planar_faces": non_planar,
+        "degenerate_triangles": triangle_faces[degenerate],
+        "sliver_triangles": triangle_faces[sliver],
+        "duplicate_faces": duplicate_faces(packed),
+    }
+    edge_sets = {
+        "collapsed_edges": np.nonzero(adjacency.ev[:,0] == adjacency.ev[:,1])[0],
+        "non_manifold_edges": np.nonzero(counts > 2)[0],
+        "inconsistent_orientation_edges": manifold[adjacency.he_origin[h1] == adjacency.he_origin[h2]],
+    }
+    edge_mesh = face_mesh(adjacency.ef[adjacency.ef_offsets[:-1]])
+    triangle_mesh = face_mesh(triangle_faces)
+    vertex_mesh = lambda v: np.searchsorted(vertex_starts, v, side="right") - 1
+    counts = {
+        "faces": np.diff(face_starts),
+        "vertices": np.diff(vertex_starts),
+        "edges": np.bincount(edge_mesh, minlength=n),
+        "triangles": np.bincount(triangle_mesh, minlength=n),
+        "boundary_edges": np.bincount(edge_mesh[adjacency.boundary_edges], minlength=n),
+        "boundary_vertices": np.bincount(vertex_mesh(adjacency.boundary_vertices), minlength=n),
+    }
+
+    reports = []
+    for k in range(n):
+        s, e = face_starts[k], face_starts[k+1]
+        report = { key: int(value[k]) for key, value in counts.items() }
+        report["max_planarity_error"] = float(np.max(planarity[s:e], initial=0.0))
+        report["min_triangle_quality"] = float(np.min(qualities[triangle_mesh == k], initial=1.0))
+        for key, faces in face_sets.items():
+            report[key] = (faces[(faces >= s) & (faces < e)] - s).tolist()
+        for key, edges in edge_sets.items():
+            report[key] = (adjacency.ev[edges[edge_mesh[edges] == k]] - vertex_starts[k]).tolist()
+        reports.append(report)
+    return reports
+
+def mesh_diagnostics(mesh, EPSILON=1.0e-9):
+    """Computes the report of a single Mesh3 or PackedMesh3, see mesh_reports.
+    """
+    return mesh_reports([mesh], EPSILON)[0]
+
+def summarize(report):
+    """Number of problems of each kind in a mesh report.
+    """
+    keys = ("non_planar_faces", "degenerate_triangles", "sliver_triangles", "collapsed_edges",
+            "non_manifold_edges", "duplicate_faces", "inconsistent_orientation_edges")
+    return { key: len(report[key]) for key in keys }
+
+def run(data, file_name=None):
+    """Computes reports for all meshes in data and optionally writes them
+    to a JSON file. Returns the reports keyed by mesh name and key.
+    """
+    names = ("cushions", "slate", "rails", "rail_sights", "liners", "casing")
+    keys = [(name, key) for name in names for key in data[name]]
+    reports = { name: {} for name in names }
+    totals = {}
+    for (name, key), report in zip(keys, mesh_reports(data[name][key] for name, key in keys)):
+        reports[name][str(key)] = report
+        for problem, count in summarize(report).items():
+            totals[problem] = totals.get(problem, 0) + count
+    if file_name is not None:
+        with open(file_name, "w") as file:
+            file.write(json.dumps({ "totals": totals, "meshes": reports }, indent=4))
+        print(f"File {file_name} written.")
+    return reports
@@ -19,24 +19,12 @@ def normalize(p):
 
 def to_mesh(obj):
     # Converts { "vertices": ..., "faces": ... } to Mesh3
-    mesh = mesh3.Mesh3()
-    for face in obj["faces"]:
-        points = [obj["vertices"][k] for k in face]
-        face = mesh3.Face3(points)
-        mesh.add_face(face)
-    return mesh
+    return mesh3.Mesh3.from_polygons(obj["vertices"], obj["faces"])
 
 def apply_reflections(points, reflect_plane_list):
     """Applies one or multiple reflections to a point or list of points.
     """
-    if isinstance(reflect_plane_list, geometry3.Plane):
-        reflect_plane_list = [reflect_plane_list]
-    if isinstance(points, np.ndarray) and points.ndim == 1:
-        p = points
-        for reflect_plane in reflect_plane_list:
-            p = reflect_plane.reflect(p)
-        return p
-    return [apply_reflections(p, reflect_plane_list) for p in points]
+    return geometry3.reflect_points(points, reflect_plane_list)
 
 def pool_cushion(data, p1, p2, pn, h_angle1, v_angle1, h_angle2, v_angle2, cushion_name):
     """Returns vertices and faces for given cushion based on the specs.
@@ -80,11 +68,9 @@ def pool_cushion(data, p1, p2, pn, h_angle1, v_angle1, h_angle2, v_angle2, cushi
     data["planes"][cushion_name]["slate"] = plane_slate
 
     planes = [plane_rail_back, plane_rail_top, plane_rubber_top, plane_rubber_bottom, plane_slate]
-    v_list = []
-    for k in range(len(planes)):
-        v_list.append(geometry3.Plane.intersection(plane_end1, planes[k], planes[(k+1)%len(planes)]))
-    for k in range(len(planes)):
-        v_list.append(geometry3.Plane.intersection(plane_end2, planes[k], planes[(k+1)%len(planes)]))
+    ends = [plane_end1]*len(planes) + [plane_end2]*len(planes)
+    rolled = planes[1:] + planes[:1]
+    v_list = list(geometry3.Plane.intersections(ends, planes+planes, rolled+rolled))
 
     f_list = []
     # endcaps:
@@ -268,8 +254,8 @@ def create_pocket_liner_arc(data, pocket, bulge, height):
     plane_rail_back = data["planes"][CUSHION_NAME]["rail_back"]
 
     # First we need the starting point and direction:
-    start = geometry3.Plane.intersection(plane_end, plane_z_is_height, plane_rail_back)
-    sp = geometry3.Plane.intersection(plane_end, plane_z_is_height, geometry3.Plane.translate(plane_rail_back, 1.0))
+    start, sp = geometry3.Plane.intersections(plane_end, plane_z_is_height, 
+            [plane_rail_back, geometry3.Plane.translate(plane_rail_back, 1.0)])
     start_dir = normalize(sp-start)
 
     # Next we need to find the closest point on the line (start+t*start_dir) to center_3:
@@ -283,8 +269,7 @@ def create_pocket_liner_arc(data, pocket, bulge, height):
     for k in range(NUM_POINTS):
         t = k / (NUM_POINTS-1)
         arc.append(circle_path(t))
-    for p in list(reversed(arc))[1:]:
-        arc.append(bisector.reflect(p))
+    arc.extend(bisector.reflect(list(reversed(arc))[1:]))
 
     # Finally, apply final_reflections:
     # for reflect_plane in final_reflects:
@@ -445,15 +430,15 @@ def rail_top(data, cushion_pocket: str):
     elif cushion_pocket == "C3":
         vertices = data["planes"]["bisector_3"].reflect(list(reversed(base)))
     elif cushion_pocket == "C4":
-        vertices = data["planes"]["bisector_4"].reflect(plane_E2.reflect(base))
+        vertices = apply_reflections(base, [plane_E2, data["planes"]["bisector_4"]])
     elif cushion_pocket in ("D4", "D5"):
         vertices = plane_E2.reflect(list(reversed(base)))
     elif cushion_pocket in ("E5", "E6"):
-        vertices = plane_E2.reflect(plane_E1.reflect(base))
+        vertices = apply_reflections(base, [plane_E1, plane_E2])
     elif cushion_pocket == "F6":
         vertices = apply_reflections(list(reversed(base)), [plane_E1, plane_E2, data["planes"]["bisector_6"]])
     elif cushion_pocket == "F1":
-        vertices = data["planes"]["bisector_1"].reflect(plane_E1.reflect(base))
+        vertices = apply_reflections(base, [plane_E1, data["planes"]["bisector_1"]])
 
     return to_mesh({ "vertices": vertices, "faces": [list(range(len(vertices)))] })
 
@@ -486,7 +471,7 @@ def create_rail_sights(data):
     rs["C"] = [np.array((x0, -w/2+offset1, h0)), np.array((x1, -w/2+offset1, h0)), np.array((x1, w/2-offset1, h0)), np.array((x0, w/2-offset1, h0))]
     rs["A"] = plane_E1.reflect(list(reversed(rs["B"])))
     rs["D"] = plane_E2.reflect(list(reversed(rs["B"])))
-    rs["E"] = plane_E1.reflect(plane_E2.reflect(rs["B"]))
+    rs["E"] = apply_reflections(rs["B"], [plane_E2, plane_E1])
     rs["F"] = plane_E1.reflect(list(reversed(rs["C"])))
     f = lambda v_list: to_mesh({ "vertices": v_list, "faces": [[0, 1, 2, 3]] })
     return { cushion: f(rs[cushion]) for cushion in ("A", "B", "C", "D", "E", "F") }
@@ -0,0 +1,166 @@
+"""Resolution tiers and mipmaps of the uv atlas. Filtering is weighted by a
+chart coverage mask so that the background between the uv charts does not
+bleed into the charts when the atlas is scaled down. Each tier is written as
+JPEG and WebP together with its mip chain (levels 1, 2, .. packed side by
+side into one strip image) and a JSON manifest listing the files and the
+pixel rectangles of the mip levels. Level sizes follow the GL rule 
+max(1, size >> level), so the chains are complete also for textures whose 
+sizes are not powers of two. The same filtering fills the gutter around the 
+charts (push_pull) so that narrow gaps between charts suffice. The manifest
+gives the last mip level of each tier where the gap is still a texel wide, in
+smaller tiers and coarser levels neighboring charts mix at their borders.
+"""
+
+import json, os
+import numpy as np
+from PIL import Image
+
+TIER_SIZES = (512, 1024, 2048)
+QUALITY = 80
+FORMATS = ("jpg", "webp")
+# WebP encoder effort 0..6, higher is smaller and slower:
+WEBP_METHOD = 2
+
+# Weight of uncovered pixels, so blocks without coverage get the plain average:
+BACKGROUND_WEIGHT = 1.0e-3
+
+def _halve(a, axis):
+    """Means of pairs along axis of a, an odd last element is folded into the 
+    last pair. The size n becomes max(1, n//2).
+    """
+    n = a.shape[axis]
+    if n == 1:
+        return a
+    a = np.moveaxis(a, axis, 0)
+    m = n // 2
+    half = a[0:2*m:2] + a[1:2*m:2]
+    counts = np.full(m, 2.0, dtype=np.float32)
+    if n % 2:
+        half[-1] += a[-1]
+        counts[-1] = 3.0
+    half /= counts.reshape((m,) + (1,)*(a.ndim-1))
+    return np.moveaxis(half, 0, axis)
+
+def downsample(premultiplied, weight):
+    """Halves a weighted image given as premultiplied colors (H,W,C) and 
+    weights (H,W) with a box filter. Level sizes follow the GL rule: the next 
+    level is (max(1,H//2), max(1,W//2)).
+    """
+    return _halve(_halve(premultiplied, 0), 1), _halve(_halve(weight, 0), 1)
+
+def premultiply(image, mask):
+    weight = np.maximum(np.asarray(mask, dtype=np.float32), BACKGROUND_WEIGHT)
+    return np.asarray(image, dtype=np.float32)*weight[...,None], weight
+
+def unpremultiply(premultiplied, weight):
+    return premultiplied / weight[...,None]
+
+def resize(premultiplied, weight, size):
+    """Resizes a weighted image (see downsample) to size=(w,h) with a box filter.
+    """
+    def box(channel):
+        return np.asarray(Image.fromarray(np.ascontiguousarray(channel, dtype=np.float32), "F").resize(size, Image.Resampling.BOX))
+    return np.stack([box(premultiplied[...,c]) for c in range(premultiplied.shape[2])], axis=-1), box(weight)
+
+def mip_chain(premultiplied, weight):
+    """Returns the list of mip levels 0, 1, .. (down to 1x1) of a weighted image
+    as plain colors.
+    """
+    levels = [unpremultiply(premultiplied, weight)]
+    while max(weight.shape) > 1:
+        premultiplied, weight = downsample(premultiplied, weight)
+        levels.append(unpremultiply(premultiplied, weight))
+    return levels
+
+def push_pull(image, mask):
+    """Fills the pixels of image (H,W,C) outside the coverage mask (H,W) from 
+    the covered ones: coverage-weighted averages are pulled down the mip 
+    chain and pushed back up into the uncovered pixels. Pixels near a chart 
+    get colors from its border, covered pixels are unchanged.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    weight = mask.astype(np.float32)
+    levels = [(np.asarray(image, dtype=np.float32)*weight[...,None], weight)]
+    while max(levels[-1][1].shape) > 1:
+        levels.append(downsample(*levels[-1]))
+    filled = None
+    for premultiplied, weight in reversed(levels):
+        covered = (weight > 0.0)[...,None]
+        color = premultiplied / np.where(covered, weight[...,None], 1.0)
+        if filled is not None:
+            # Pixel i covers pixel i//2 of the next level, the folded last one i//2-1:
+            rows = np.minimum(np.arange(weight.shape[0])//2, filled.shape[0]-1)
+            cols = np.minimum(np.arange(weight.shape[1])//2, filled.shape[1]-1)
+            up = filled.take(rows, 0).take(cols, 1)
+            color = np.where(covered, color, up)
+        filled = color
+    filled = np.clip(np.round(filled), 0, 255).astype(np.uint8) if np.asarray(image).dtype == np.uint8 else filled
+    return np.where(mask[...,None], image, filled)
+
+def pack_mips(levels):
+    """Places mip levels 1, 2, .. side by side in one strip. Returns the strip
+    and the rectangles (x,y,w,h) of the levels in it.
+    """
+    rects, x = [], 0
+    for level in levels[1:]:
+        rects.append((x, 0, level.shape[1], level.shape[0]))
+        x += level.shape[1]
+    strip = np.zeros((levels[1].shape[0] if len(levels) > 1 else 1, max(x, 1), levels[0].shape[2]), dtype=levels[0].dtype)
+    for (x, y, w, h), level in zip(rects, levels[1:]):
+        strip[y:y+h,x:x+w] = level
+    return strip, rects
+
+def save_image(image, file_name):
+    """Saves a float or uint8 RGB array in the format given by the file extension.
+    """
+    image = Image.fromarray(np.clip(np.round(image), 0, 255).astype(np.uint8), "RGB")
+    options = { "method": WEBP_METHOD } if file_name.endswith(".webp") else {}
+    image.save(file_name, quality=QUALITY, **options)
+    print(f"File {file_name} written.")
+
+def max_level(gap, scale, n_levels):
+    """Last mip level where a gap of gap pixels around the charts in the full 
+    atlas is still at least one texel wide when the atlas is scaled by scale,
+    0 if it is narrower already at level 0.
+    """
+    if gap * scale < 1.0:
+        return 0
+    return min(int(np.floor(np.log2(gap*scale))), n_levels-1)
+
+def write_tiers(atlas, mask, base_name, sizes=TIER_SIZES, formats=FORMATS, gap=None):
+    """Writes the atlas (H,W,3) in resolution tiers with longest side in sizes
+    (larger sizes than the atlas are skipped) and at full resolution, which 
+    is named base_name.jpg etc. mask (H,W) is the chart coverage. If gap, the 
+    width in pixels of the gutter around the charts, is given, each tier 
+    records the last mip level that keeps the charts apart as "max_level": 
+    clients should not sample beyond it (GL_TEXTURE_MAX_LEVEL), coarser 
+    levels mix neighboring charts. Returns the manifest, which is also 
+    written to base_name.json.
+    """
+    premultiplied, weight = premultiply(np.asarray(atlas)[...,:3], mask)
+    H, W = weight.shape
+    manifest = { "width": W, "height": H, "tiers": [] }
+    for size in [s for s in sizes if s < max(W, H)] + [None]:
+        if size is None:
+            name, tier = base_name, (premultiplied, weight)
+        else:
+            scale = size / max(W, H)
+            name = f"{base_name}_{size}"
+            tier = resize(premultiplied, weight, (max(1, round(scale*W)), max(1, round(scale*H))))
+        levels = mip_chain(*tier)
+        strip, rects = pack_mips(levels)
+        tier = levels[0]
+        entry = { "width": tier.shape[1], "height": tier.shape[0], "files": {}, "mips": { "files": {}, "levels": rects } }
+        if gap is not None:
+            entry["max_level"] = max_level(gap, tier.shape[1]/W, len(levels))
+        for ext in formats:
+            save_image(tier, f"{name}.{ext}")
+            save_image(strip, f"{name}_mips.{ext}")
+            entry["files"][ext] = os.path.basename(f"{name}.{ext}")
+            entry["mips"]["files"][ext] = os.path.basename(f"{name}_mips.{ext}")
+        manifest["tiers"].append(entry)
+    file_name = f"{base_name}.json"
+    with open(file_name, "w") as file:
+        file.write(json.dumps(manifest, indent=4))
+    print(f"File {file_name} written.")
+    return manifest
@@ -7,6 +7,7 @@ original face (ANGLE_LIMIT).
 
 import json, pickle
 import numpy as np
+import scipy.sparse
 import geometry3, mesh3
 
 E1 = np.array((1.0, 0.0, 0.0))
@@ -22,66 +23,106 @@ def normalize(p):
     return p / np.linalg.norm(p)
 
 def test_planarity(mesh: mesh3.Mesh3):
-    # Tests the planarity of faces in the mesh.
-    for f in mesh.fs:
-        xs = [np.dot(p-f.basis[3], f.basis[0]) for p in f.pts]
-        ys = [np.dot(p-f.basis[3], f.basis[1]) for p in f.pts]
-        zs = [np.dot(p-f.basis[3], f.basis[2]) for p in f.pts]
-        bbox_dims = [np.max(xs)-np.min(xs), np.max(ys)-np.min(ys), np.max(zs)-np.min(zs)]
-        if bbox_dims[2] == 0.0:
-            return float('inf')
-        planarity = np.min([bbox_dims[0], bbox_dims[1]]) / bbox_dims[2]
-        if abs(planarity) < 1.0e12:
-            raise Exception(f"Nonplanar face: {planarity = }")
+    # Tests the planarity of faces in the mesh: the thickness of each face along 
+    # its normal has to be tiny compared to its extent in the plane.
+    if len(mesh.fs) == 0:
+        return
+    face_offsets = np.concatenate(([0], np.cumsum([face.n for face in mesh.fs])))
+    corner_faces = np.repeat(np.arange(len(mesh.fs)), np.diff(face_offsets))
+    bases = np.array([face.basis[:3] for face in mesh.fs])      # (F,3,3)
+    centers = np.array([face.basis[3] for face in mesh.fs])
+    pts = np.concatenate([face.pts for face in mesh.fs])
+    coords = np.einsum("cij,cj->ci", bases[corner_faces], pts - centers[corner_faces])
+    bbox_dims = np.maximum.reduceat(coords, face_offsets[:-1]) - np.minimum.reduceat(coords, face_offsets[:-1])
+    thick = bbox_dims[:,2] > 0.0
+    planarity = np.min(bbox_dims[thick,:2], axis=1) / bbox_dims[thick,2]
+    if np.any(planarity < 1.0e12):
+        raise Exception(f"Nonplanar face: planarity = {np.min(planarity)}")
+
+def slate_cutoff_faces(data, name, centers):
+    # Returns a boolean array telling which faces (given by their centers) are 
+    # the slate faces at the x or y cutoff.
+    if name != "slate":
+        return np.zeros(len(centers), dtype=bool)
+    return ((np.abs(np.abs(centers[:,0])-data["specs"]["TABLE_LENGTH"]/2.0-data["specs"]["CUSHION_WIDTH"]) < 1.0e-9) 
+            | (np.abs(np.abs(centers[:,1])-data["specs"]["TABLE_LENGTH"]/4.0-data["specs"]["CUSHION_WIDTH"]) < 1.0e-9))
 
 def is_slate_cutoff_face(data, name, face):
     # Returns true if f is one of the slate faces that are at the x or y cutoff.
-    v_avg = face.basis[3]
-    if (name == "slate") and ((np.abs(np.abs(v_avg[0])-data["specs"]["TABLE_LENGTH"]/2.0-data["specs"]["CUSHION_WIDTH"]) < 1.0e-9) 
-            or (np.abs(np.abs(v_avg[1])-data["specs"]["TABLE_LENGTH"]/4.0-data["specs"]["CUSHION_WIDTH"]) < 1.0e-9)):
-        return True
-    return False
+    return bool(slate_cutoff_faces(data, name, face.basis[3][None,:])[0])
+
+def smooth_normals(adjacency: mesh3.MeshAdjacency, face_normals, angle_limit, weighting="none", excluded=None):
+    """Averages face normals around vertices. Corner c of face f gets the normalized 
+    weighted sum of the normals of the faces around its vertex that are within 
+    angle_limit of the normal of f (a crease mask) and not excluded. This is a 
+    sparse corner-face matrix times the face normals. Weighting is "none", "area" 
+    (face areas) or "angle" (corner angles). Corners with nothing to average 
+    keep the face normal. Returns (C,3) array of corner normals.
+    """
+    face_normals = np.asarray(face_normals, dtype=float)
+    n_faces, n_corners = len(face_normals), len(adjacency.he_origin)
+    # Pairs (corner, other corner at the same vertex):
+    vertex_corners = np.argsort(adjacency.he_origin, kind="stable")
+    degree = np.bincount(adjacency.he_origin, minlength=adjacency.n_vertices)
+    vertex_start = np.concatenate(([0], np.cumsum(degree)))
+    count = degree[adjacency.he_origin]
+    rows = np.repeat(np.arange(n_corners), count)
+    ramp = np.arange(len(rows)) - np.repeat(np.cumsum(count)-count, count)
+    others = vertex_corners[np.repeat(vertex_start[adjacency.he_origin], count) + ramp]
+    cols = adjacency.he_face[others]
 
-def compute_smooth_normals(data, name, mesh, mesh_indexing):
-    # Adds smooth normals to the mesh. These are averaged normals.
-    for fk, face in enumerate(mesh_indexing["f"]):
-        n0 = face.basis[2]
-        for pk, p in enumerate(mesh_indexing["fv"][fk]):
-            close_normals = []
-            for f_other in mesh_indexing["vf"][p]:
-                face_other = mesh.fs[f_other]
-                n = mesh.fs[f_other].basis[2]
-                if np.dot(n, n0) > np.cos(ANGLE_LIMIT_SPECIAL.get(name, ANGLE_LIMIT_DEFAULT)):
-                    if not is_slate_cutoff_face(data, name, face_other):
-                        close_normals.append(n)
-            n = normalize(np.sum(close_normals, axis=0)) if len(close_normals) > 0 else n0
-            face.ns[pk] = n
+    if weighting == "none":
+        weights = np.ones(len(rows))
+    elif weighting == "area":
+        p, q = adjacency.vertices[adjacency.he_origin], adjacency.vertices[adjacency.he_target]
+        vector_area = np.column_stack([np.bincount(adjacency.he_face, weights=w, minlength=n_faces) for w in np.cross(p, q).T])
+        weights = 0.5*np.linalg.norm(vector_area, axis=1)[cols]
+    elif weighting == "angle":
+        p = adjacency.vertices[adjacency.he_origin]
+        a = adjacency.vertices[adjacency.he_target] - p
+        b = adjacency.vertices[adjacency.he_origin[adjacency.he_prev]] - p
+        angles = np.arctan2(np.linalg.norm(np.cross(a, b), axis=1), np.sum(a*b, axis=1))
+        weights = angles[others]
+    else:
+        raise ValueError(f"Unknown weighting: {weighting}")
 
-def select_normals(data, name, mesh):
+    mask = np.sum(face_normals[cols]*face_normals[adjacency.he_face[rows]], axis=1) > np.cos(angle_limit)
+    if excluded is not None:
+        mask &= ~np.asarray(excluded, dtype=bool)[cols]
+    incidence = scipy.sparse.csr_matrix((weights*mask, (rows, cols)), shape=(n_corners, n_faces))
+    sums = incidence @ face_normals
+    lengths = np.linalg.norm(sums, axis=1)
+    flat = face_normals[adjacency.he_face]
+    return np.where((lengths > 0.0)[:,None], sums / np.where(lengths > 0.0, lengths, 1.0)[:,None], flat)
+
+def compute_smooth_normals(data, name, mesh, face_normals, excluded):
+    # Returns smooth corner normals for the mesh. These are averaged normals.
+    angle_limit = ANGLE_LIMIT_SPECIAL.get(name, ANGLE_LIMIT_DEFAULT)
+    return smooth_normals(mesh.adjacency(), face_normals, angle_limit, excluded=excluded)
+
+def select_normals(data, name, mesh, face_normals, corner_normals, excluded):
     """Select between normals from smooth_normals and flat_normals
-    based on custom rules.
+    based on custom rules. Returns the chosen corner normals.
     """
-    for fk, face in enumerate(mesh.fs):
-        n0 = face.basis[2]
-        for n_index, n1 in enumerate(face.ns):
-            n = n1
-            if (np.linalg.norm(n0-E3) < 1.0e-9) or (np.linalg.norm(n0+E3) < 1.0e-9):
-                n = n0
-            if is_slate_cutoff_face(data, name, face):
-                n = n0
-            if (name == "cushions") or (name == "rails") or (name == "rail_sights"):
-                n = n0
-
-            face.ns[n_index] = n
+    flat = (np.linalg.norm(face_normals-E3, axis=1) < 1.0e-9) | (np.linalg.norm(face_normals+E3, axis=1) < 1.0e-9)
+    flat |= excluded
+    if (name == "cushions") or (name == "rails") or (name == "rail_sights"):
+        flat[:] = True
+    corner_faces = mesh.adjacency().he_face
+    return np.where(flat[corner_faces][:,None], face_normals[corner_faces], corner_normals)
 
 def run(data):
     data["normals"] = dict()
     for name in ["cushions", "slate", "rails", "rail_sights", "liners", "casing"]:
         for mesh in data[name].values():
-            mesh_indexing = mesh.mesh_indexing()
             test_planarity(mesh)
-            compute_smooth_normals(data, name, mesh, mesh_indexing)
-            select_normals(data, name, mesh)
+            face_normals = np.array([face.basis[2] for face in mesh.fs])
+            excluded = slate_cutoff_faces(data, name, np.array([face.basis[3] for face in mesh.fs]))
+            corner_normals = compute_smooth_normals(data, name, mesh, face_normals, excluded)
+            corner_normals = select_normals(data, name, mesh, face_normals, corner_normals, excluded)
+            offsets = mesh.adjacency().face_offsets
+            for fk, face in enumerate(mesh.fs):
+                face.ns = list(corner_normals[offsets[fk]:offsets[fk+1]])
     return data
 
 if __name__ == "__main__":
@@ -151,12 +151,14 @@ def create_pooltable_specs():
     comment = "First number controls number of points on the rounded edge of the casing, second number controls number of points for the bevel on the casing."
     add_spec(specs, "TABLE_CASING_NUM_POINTS", (5, 5), comment)
 
-    comment = "Gap in pixels left on the border of the uv-patch to prevent color smearing with JPEG artifacts."
-    add_spec(specs, "UV_TEXTURE_GAP", 8, comment)
+    comment = "Gap in pixels left on the border of the uv-patch, the gap is filled with border colors of the patch to prevent color smearing with JPEG artifacts and filtering. The downscaled tiers of the atlas keep patches apart only down to their max_level, see pooltable_mipmaps."
+    add_spec(specs, "UV_TEXTURE_GAP", 2, comment)
     comment = "Base resolution of the uv-map."
     add_spec(specs, "UV_PIXELS_PER_METER", 128, comment)
     comment = "Multipliers for base resolution of the uv-map used for prominent parts of the mesh."
     add_spec(specs, "UV_ENHANCE_FACTOR", (4, 8), comment)
+    comment = "Algorithm for packing the uv-patches into the atlas: \"maxrects\" packs tightest, \"skyline\" is faster for quick builds."
+    add_spec(specs, "UV_PACKING_STRATEGY", "maxrects", comment)
     
     return specs
 
@@ -224,22 +226,25 @@ def create_sights_metadata(data):
     sights_b = [np.array((x0*k/4, y0+depth, h0)) for k in range(1, 4)]
     sights_c = [np.array((x0+depth, y0-(2*y0)*k/4, h0)) for k in range(1, 4)]
     return { "A": plane_E1.reflect(reversed(sights_b)), "B": sights_b, "C": sights_c,
-             "D": plane_E2.reflect(reversed(sights_b)), "E": plane_E2.reflect(plane_E1.reflect(sights_b)),
+             "D": plane_E2.reflect(reversed(sights_b)), "E": geometry3.reflect_points(sights_b, [plane_E1, plane_E2]),
              "F": plane_E1.reflect(reversed(sights_c)) }
 
 def create_pocket_fall_metadata(data, meta, box):
-    box_corners = (np.array((-box[0], box[1])), np.array((box[0], box[1])), np.array((box[0], -box[1])), np.array((-box[0], -box[1])))
-    box_ls = tuple(geometry2.LineSegment2(box_corners[k], box_corners[(k+1)%4]) for k in range(4))
-    slate_corners = []
+    box_corners = np.array(((-box[0], box[1]), (box[0], box[1]), (box[0], -box[1]), (-box[0], -box[1])))
+    box_segments = np.stack((box_corners, np.roll(box_corners, -1, axis=0)), axis=1)
 
     for k in range(1, 7):
         meta[f"pocket_fall_center_{k}"] = data["points"][f"fall_center_{k}"]
         pocket_type = "SIDE" if (k in (2, 5)) else "CORNER"
         meta[f"pocket_fall_radius_{k}"] = data["specs"][f"{pocket_type}_POCKET_RADIUS"]
 
-        for ls in box_ls:
-            intersections = geometry2.intersections_circle_ls(meta[f"pocket_fall_center_{k}"][0:2], meta[f"pocket_fall_radius_{k}"], ls)
-            slate_corners.extend(intersections)
+    # Intersections of all six pocket fall circles with the four box edges at once:
+    centers = [meta[f"pocket_fall_center_{k}"][0:2] for k in range(1, 7)]
+    radii = [meta[f"pocket_fall_radius_{k}"] for k in range(1, 7)]
+    t = geometry2.intersections_circle_segments(centers, radii, box_segments)     # (pocket,edge,2)
+    points = geometry2.segment_points(box_segments, np.moveaxis(t, -1, 1))       # (pocket,2,edge,2)
+    points = np.moveaxis(points, 1, 2).reshape(-1, 2)
+    slate_corners = list(points[~np.isnan(t.reshape(-1))])
     # corners of the slate where the pocket fall circles intersect the flat slate edges
     if (len(slate_corners) != 12):
         raise Exception(f"Error computing pocket_fall_corners: found {len(slate_corners)} instead of 12.")
@@ -0,0 +1,72 @@
+"""Tangent space for normal mapping. Tangents are computed per corner of the
+final triangle meshes from the uv-coordinates and written next to the OBJ
+files as raw little-endian float32 (x,y,z,w) quadruples, one per face corner
+in the order the corners appear in the OBJ file (the order of a non-indexed
+buffer geometry). The bitangent is w*cross(normal, tangent), w=-1 appears
+where the uv mapping is mirrored, for example on reflected cushions.
+"""
+
+import numpy as np
+import mesh3
+
+def triangle_tangents(positions, uvs):
+    """Returns unnormalized (tangent, bitangent) arrays (T,3) for triangles
+    positions (T,3,3) with uv-coordinates uvs (T,3,2). They are the directions
+    of increasing u and v, scaled by the sign of the uv area so that larger
+    triangles weigh more when they are summed. Degenerate uvs give zeros.
+    """
+    e1, e2 = positions[:,1]-positions[:,0], positions[:,2]-positions[:,0]
+    d1, d2 = uvs[:,1]-uvs[:,0], uvs[:,2]-uvs[:,0]
+    det = d1[:,0]*d2[:,1] - d2[:,0]*d1[:,1]
+    sign = np.sign(det)[:,None]
+    tangents = sign * (e1*d2[:,1,None] - e2*d1[:,1,None])
+    bitangents = sign * (e2*d1[:,0,None] - e1*d2[:,0,None])
+    return tangents, bitangents
+
+def _perpendicular(n):
+    """Some unit vectors perpendicular to unit vectors n (N,3).
+    """
+    axis = np.where((np.abs(n[:,0]) < 0.9)[:,None], np.array((1.0, 0.0, 0.0)), np.array((0.0, 1.0, 0.0)))
+    t = np.cross(axis, n)
+    return t / np.linalg.norm(t, axis=1)[:,None]
+
+def corner_tangents(packed, EPSILON=1.0e-9):
+    """Returns (C,4) tangents of a triangle PackedMesh3. Triangle tangents are
+    summed over corners that share position, normal and uv (one OBJ vertex),
+    so they are smooth inside uv charts and split at uv seams. Tangents are
+    orthogonalized against the corner normal and w gives the handedness.
+    """
+    if not packed.is_triangle_mesh():
+        raise ValueError("Tangents need a triangle mesh.")
+    n_corners = len(packed.face_indices)
+    if n_corners == 0:
+        return np.zeros((0, 4))
+    tangents, bitangents = triangle_tangents(packed.corner_positions.reshape(-1, 3, 3), packed.uvs.reshape(-1, 3, 2))
+    _, normal_indexing = mesh3.weld(packed.normals, EPSILON)
+    _, uv_indexing = mesh3.weld(packed.uvs, EPSILON)
+    keys = np.column_stack((packed.face_indices, normal_indexing, uv_indexing))
+    _, vertex = np.unique(keys, axis=0, return_inverse=True)
+    vertex = vertex.reshape(-1)
+    n_vertices = np.max(vertex) + 1
+    corner_faces = packed.corner_faces
+    sum_t = np.column_stack([np.bincount(vertex, weights=w, minlength=n_vertices) for w in tangents[corner_faces].T])
+    sum_b = np.column_stack([np.bincount(vertex, weights=w, minlength=n_vertices) for w in bitangents[corner_faces].T])
+
+    n = packed.normals / np.linalg.norm(packed.normals, axis=1)[:,None]
+    t = sum_t[vertex]
+    t = t - np.sum(n*t, axis=1)[:,None]*n       # Gram-Schmidt
+    length = np.linalg.norm(t, axis=1)
+    ok = length > EPSILON*np.maximum(np.linalg.norm(sum_t[vertex], axis=1), EPSILON)
+    t = np.where(ok[:,None], t / np.where(ok, length, 1.0)[:,None], _perpendicular(n))
+    w = np.where(np.sum(np.cross(n, t)*sum_b[vertex], axis=1) < 0.0, -1.0, 1.0)
+    return np.column_stack((t, w))
+
+def write_tangents_file(packed, file_name):
+    """Writes the corner tangents of packed as float32 in OBJ corner order.
+    The corners of the face groups are written group by group like write_obj_file.
+    """
+    tangents = corner_tangents(packed)
+    corners = [np.arange(packed.face_offsets[start], packed.face_offsets[end]) for start, end in packed.groups.values()]
+    corners = np.concatenate(corners) if corners else np.zeros(0, dtype=np.int64)
+    tangents[corners].astype("<f4").tofile(file_name)
+    print(f"File {file_name} written.")
@@ -0,0 +1,107 @@
+"""Source textures for the uv atlas. Images are looked up in an asset
+directory and decoded once into an on-disk cache of .npy files keyed by the
+hash of the image file. Cached textures are opened as memory-mapped arrays so
+that the atlas compositor only reads the rows it samples. The cache keeps its
+size under a byte budget by evicting the least recently used files.
+
+The directories can be set with the environment variables
+    POOLTABLE_ASSET_DIR: directory of the source images, resources/img next 
+        to this module by default
+    POOLTABLE_TEXTURE_CACHE: directory of the decoded textures
+"""
+
+import os, hashlib, collections
+import numpy as np
+from PIL import Image
+
+ASSET_DIR = os.environ.get("POOLTABLE_ASSET_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "img"))
+CACHE_DIR = os.environ.get("POOLTABLE_TEXTURE_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "pooltable", "textures"))
+CACHE_MAX_BYTES = 1 << 30
+
+def asset_path(name):
+    return os.path.join(ASSET_DIR, name)
+
+def file_hash(file_name):
+    """SHA-1 of the contents of a file as a hex string.
+    """
+    h = hashlib.sha1()
+    with open(file_name, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def decode_image(file_name):
+    """Decodes an image file into an (h,w,3) uint8 array.
+    """
+    with Image.open(file_name) as image:
+        return np.asarray(image.convert("RGB"))
+
+class TextureCache:
+    """Decoded textures stored as .npy files in cache_dir. At most max_open
+    memory maps are kept open and the files are evicted least recently used
+    first when their total size exceeds max_bytes. File modification times
+    record the use so the order is kept across runs.
+    """
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_open=16):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_open = max_open
+        self._open = collections.OrderedDict()
+
+    def _cache_file(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def load(self, file_name):
+        """Returns the decoded image file_name as a read-only memory-mapped
+        (h,w,3) uint8 array, decoding it only if it is not cached yet.
+        """
+        key = file_hash(file_name)
+        cache_file = self._cache_file(key)
+        if key in self._open:
+            self._open.move_to_end(key)
+        else:
+            if not os.path.exists(cache_file):
+                os.makedirs(self.cache_dir, exist_ok=True)
+                temp_file = f"{cache_file}.{os.getpid()}.tmp"
+                with open(temp_file, "wb") as file:
+                    np.save(file, decode_image(file_name))
+                os.replace(temp_file, cache_file)
+            self._open[key] = np.load(cache_file, mmap_mode="r")
+            if len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        os.utime(cache_file)
+        self.evict(keep=cache_file)
+        return self._open[key]
+
+    def evict(self, keep=None):
+        """Removes least recently used files until the cache fits in max_bytes.
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".npy") and entry.path != keep:
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        if keep is not None:
+            total += os.path.getsize(keep)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            key = os.path.basename(path)[:-4]
+            self._open.pop(key, None)
+            try:
+                os.remove(path)
+            except OSError:
+                continue    # Still mapped on some platforms, try again next time
+            total -= size
+
+_default_cache = None
+
+def load_texture(name):
+    """Loads the texture file name from the asset directory through the
+    default cache.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = TextureCache()
+    return _default_cache.load(asset_path(name))
@@ -8,11 +8,12 @@ Containers (=materials):
     6) Casing ("casing", 0-4)
 """
 
+import collections
 import numpy as np
 from PIL import Image, ImageDraw
 # from scipy.spatial.transform import Rotation
 from typing import Any
-import geometry3, mesh3, packer
+import bvh3, geometry3, mesh3, packer, pooltable_mipmaps, pooltable_textures
 
 E1 = np.array((1.0, 0.0, 0.0))
 E2 = np.array((0.0, 1.0, 0.0))
@@ -25,32 +26,31 @@ DEGREE = np.pi/180.0
 def normalize(p):
     return p / np.linalg.norm(p)
 
-def propagate(face_from, face):
-    """Propagates uv-coords across a common edge from self to other face.
+def propagate(face_from, face, common_pts=None):
+    """Propagates uv-coords across a common edge from face_from to face.
+    common_pts are two pairs (corner of face_from, corner of face) of shared 
+    vertices, if not given they are found by comparing positions.
     """
-    # Create a list of vertices that both faces share:
-    common_pts = []
-    for kp_from, p_from in enumerate(face_from.pts):
-        for kp_to, p_to in enumerate(face.pts):
-            if np.linalg.norm(p_from-p_to) < 1.0e-9:
-                common_pts.append((kp_from, kp_to))
+    if common_pts is None:
+        # Create a list of vertices that both faces share:
+        d = np.linalg.norm(face_from.pts[:,None,:] - face.pts[None,:,:], axis=2)
+        common_pts = np.argwhere(d < 1.0e-9)
     if len(common_pts) < 2:
         return False
-    for k in range(2):
-        face.uvs[common_pts[k][1]] = face_from.uvs[common_pts[k][0]]
-    z1 = complex(np.dot(face.basis[0], face.pts[common_pts[0][1]]), np.dot(face.basis[1], face.pts[common_pts[0][1]]))
-    z2 = complex(np.dot(face.basis[0], face.pts[common_pts[1][1]]), np.dot(face.basis[1], face.pts[common_pts[1][1]]))
-    w1 = complex(face.uvs[common_pts[0][1]][0], face.uvs[common_pts[0][1]][1])
-    w2 = complex(face.uvs[common_pts[1][1]][0], face.uvs[common_pts[1][1]][1])
+    (k1_from, k1), (k2_from, k2) = common_pts[0], common_pts[1]
+    z = face.pts @ face.basis[0] + 1j*(face.pts @ face.basis[1])
+    w1 = complex(face_from.uvs[k1_from][0], face_from.uvs[k1_from][1])
+    w2 = complex(face_from.uvs[k2_from][0], face_from.uvs[k2_from][1])
     # z1 -> w1, z2 -> w2 in a similarity
     # w = A*z+B: w1-A*z1 = B, w2 = A*z2+B = A*z2 + w1 - A*z1
     # w2-w1 = A*(z2-z1): A = (w2-w1)/(z2-z1), B = w1-A*z1
-    A = (w2-w1) / (z2-z1)
-    B = w1 - A*z1
-    for kp, p in enumerate(face.pts):
-        z = complex(np.dot(face.basis[0], p), np.dot(face.basis[1], p))
-        w = A*z + B
-        face.uvs[kp] = np.array((w.real, w.imag))
+    A = (w2-w1) / (z[k2]-z[k1])
+    B = w1 - A*z[k1]
+    w = A*z + B
+    for kp in range(len(face.pts)):
+        face.uvs[kp] = np.array((w[kp].real, w[kp].imag))
+    face.uvs[k1] = face_from.uvs[k1_from]
+    face.uvs[k2] = face_from.uvs[k2_from]
     return True
 
 def init_uvs(mesh):
@@ -59,39 +59,52 @@ def init_uvs(mesh):
             face.uvs[k] = np.array((np.dot(p, E1), np.dot(p, E2)))
 
 def face_in_plane(face, plane):
-    for p in face.pts:
-        if plane.distance(p) > 1.0e-9:
-            return False
-    return True
+    return np.all(plane.distance(face.pts) <= 1.0e-9)
 
 def unwrap_cushion(data, cushion):
     """Idea: propagate the uv-coordinates from face to face in order given by 
-    propagation_order.
+    propagation_order. Faces are visited once in breadth-first order starting 
+    from the rail top, moving across shared edges of the mesh adjacency.
     """
     mesh = data["cushions"][cushion]
     propagation_order = (("rail_top", "end1"), ("rail_top", "end2"), ("rail_top", "rail_back"), ("rail_top", "rubber_top"), ("rubber_top", "rubber_bottom"), ("rubber_bottom", "slate"))
     plane_names = ("end1", "end2", "rail_back", "rail_top", "rubber_top", "rubber_bottom", "slate")
-    plane_faces = { name: set() for name in plane_names }
-    face_to_plane = {}
-    for plane_name in plane_names:
-        for face in mesh.fs:
-            if face_in_plane(face, data["planes"][cushion][plane_name]):
-                plane_faces[plane_name].add(face)
-                face_to_plane[face] = plane_name
-    propagating = plane_faces["rail_top"]
-    propagated_already = set()
+    plane_index = { name: k for k, name in enumerate(plane_names) }
+    allowed = np.eye(len(plane_names), dtype=bool)
+    for name_from, name_to in propagation_order:
+        allowed[plane_index[name_from], plane_index[name_to]] = True
+
+    adjacency = mesh.adjacency()
+    offsets = adjacency.face_offsets
+    face_plane = np.full(len(mesh.fs), -1, dtype=np.int64)
+    if len(mesh.fs) > 0:
+        corner_pts = np.concatenate([face.pts for face in mesh.fs])
+        for k, plane_name in enumerate(plane_names):
+            distances = data["planes"][cushion][plane_name].distance(corner_pts)
+            face_plane[np.maximum.reduceat(distances, offsets[:-1]) <= 1.0e-9] = k
+    unassigned = np.nonzero(face_plane < 0)[0]
+    if len(unassigned) > 0:
+        raise ValueError(f"Faces {unassigned.tolist()} of cushion {cushion} are not in any of its planes.")
+
+    propagating = collections.deque(np.nonzero(face_plane == plane_index["rail_top"])[0])
+    visited = np.zeros(len(mesh.fs), dtype=bool)
+    visited[list(propagating)] = True
     while propagating:
-        propagating_next = set()
-        for face_to in mesh.fs:
-            for face_from in propagating:
-                if (face_to_plane[face_from], face_to_plane[face_to]) not in propagation_order:
-                    if face_to_plane[face_from] != face_to_plane[face_to]:
-                        continue
-                result = propagate(face_from, face_to)
-                if result and (not face_to in propagated_already):
-                    propagating_next.add(face_to)
-        propagated_already.update(propagating)
-        propagating = propagating_next
+        f = propagating.popleft()
+        for h in range(offsets[f], offsets[f+1]):
+            e = adjacency.he_edge[h]
+            for h_to in adjacency.eh[adjacency.eh_offsets[e]:adjacency.eh_offsets[e+1]]:
+                g = adjacency.he_face[h_to]
+                if visited[g] or not allowed[face_plane[f], face_plane[g]]:
+                    continue
+                # Match the edge endpoints; h_to may run either way along the edge:
+                h_next, h_to_next = adjacency.he_next[h], adjacency.he_next[h_to]
+                if adjacency.he_origin[h_to] != adjacency.he_origin[h]:
+                    h_to, h_to_next = h_to_next, h_to
+                common_pts = ((h-offsets[f], h_to-offsets[g]), (h_next-offsets[f], h_to_next-offsets[g]))
+                propagate(mesh.fs[f], mesh.fs[g], common_pts)
+                visited[g] = True
+                propagating.append(g)
 
 def unwrap_liner(data, pocket):
     """UV-unwrap the pocket liner with uv_x=angle as seen from the center of the liner.
@@ -166,6 +179,17 @@ def uv_bounding_box(mesh, gap=0.0):
     bbox[1] = (bbox[1][0]-bbox[0][0], bbox[1][1]-bbox[0][1])
     return bbox
 
+def pack_charts(wh_list, gap, pixels_per_meter, strategy):
+    """Packs charts of sizes wh_list (2,n) in meters leaving a gap of gap 
+    pixels of the full resolution atlas around each chart. The smaller tiers 
+    have narrower gaps, pooltable_mipmaps.write_tiers records how far each 
+    tier keeps the charts apart. Returns (packing, gap) where packing has the 
+    (x,y,w,h) of the charts with their gaps as columns and gap is in meters.
+    """
+    margin = gap / pixels_per_meter
+    packing, _ = packer.pack(wh_list + 2.0*margin, strategy=strategy)
+    return packing, margin
+
 def sights_pos(data, cushion_name, index):
     """Returns position of the sights in the xy-plane.
     """
@@ -185,19 +209,56 @@ def sights_pos(data, cushion_name, index):
     if cushion_name == "F":
         return -sights_right(index)
 
+class AtlasLocator:
+    """Maps world points on a set of faces to their uv-coordinates. The faces
+    are triangulated once into a BVH3. Points inside a triangle get the uvs
+    interpolated with barycentric coordinates, points outside all faces but 
+    in the plane of some of them get the average of the affine extensions of 
+    the uv-maps of those faces.
+    """
+    def __init__(self, faces, EPSILON=1.0e-9):
+        self.EPSILON = EPSILON
+        triangles, triangle_uvs, face_ids = [], [], []
+        for fk, face in enumerate(faces):
+            uvs = np.array(face.uvs, dtype=float)
+            for ind in face.triangle_indices():
+                triangles.append(face.pts[ind])
+                triangle_uvs.append(uvs[ind])
+                face_ids.append(fk)
+        self.triangle_uvs = np.array(triangle_uvs).reshape(-1, 3, 2)
+        self.bvh = bvh3.BVH3(np.array(triangles).reshape(-1, 3, 3), np.array(face_ids, dtype=np.int64))
+
+        # Affine coordinates (c0,c1,c2) of p-v0 in the basis (v1-v0,v2-v0,normal) of each face:
+        self.origins = np.array([face.pts[0] for face in faces]).reshape(-1, 3)
+        frames = np.array([(face.pts[1]-face.pts[0], face.pts[2]-face.pts[0], face.basis[2]) for face in faces]).reshape(-1, 3, 3)
+        self.inverse_frames = np.linalg.inv(np.transpose(frames, (0, 2, 1)))
+        self.face_uvs = np.array([np.array(face.uvs[:3], dtype=float) for face in faces]).reshape(-1, 3, 2)
+
+    def __call__(self, points):
+        """Returns uvs (N,2) for points (N,3), or (2,) for a single point (3,).
+        Points not in the plane of any face get nan.
+        """
+        points = np.asarray(points, dtype=float)
+        single = points.ndim == 1
+        points = points.reshape(-1, 3)
+        n = len(points)
+        q, _, tri, bary = self.bvh.locate_points(points, self.EPSILON)
+        uv = np.einsum("ti,tij->tj", bary, self.triangle_uvs[tri])
+        counts = np.bincount(q, minlength=n)
+        uvs = np.column_stack([np.bincount(q, weights=w, minlength=n) for w in uv.T]) / np.maximum(counts, 1)[:,None]
+
+        outside = np.nonzero(counts == 0)[0]
+        if len(outside) > 0:
+            c = np.einsum("fij,nfj->nfi", self.inverse_frames, points[outside,None,:]-self.origins)
+            uv = self.face_uvs[:,0] + c[...,0,None]*(self.face_uvs[:,1]-self.face_uvs[:,0]) + c[...,1,None]*(self.face_uvs[:,2]-self.face_uvs[:,0])
+            # Only consider faces whose plane contains the point:
+            in_plane = np.abs(c[...,2]) < self.EPSILON
+            with np.errstate(invalid="ignore", divide="ignore"):
+                uvs[outside] = np.sum(np.where(in_plane[...,None], uv, 0.0), axis=1) / np.sum(in_plane, axis=1)[:,None]
+        return uvs[0] if single else uvs
+
 def world_to_atlas_coords(faces, p):
-    uvs = []
-    for face in faces:
-        v0 = face.pts[0]
-        v1, v2, v3 = face.pts[1]-v0, face.pts[2]-v0, face.basis[2]
-
-        A = np.vstack([v1, v2, v3]).T
-        c = np.linalg.solve(A, p-v0)
-        uv = face.uvs[0] + c[0]*(face.uvs[1]-face.uvs[0]) + c[1]*(face.uvs[2]-face.uvs[0])
-        if np.abs(c[2]) < 1.0e-9:
-            # Only consider faces whose plane contains the point p
-            uvs.append(uv)
-    return np.average(uvs, axis=0)
+    return AtlasLocator(faces)(p)
 
 def draw_markings(data, atlas):
     """Draws the sights (diamonds) on rail_sights.
@@ -214,9 +275,9 @@ def draw_markings(data, atlas):
     p_foot_spot = np.array((data["specs"]["TABLE_LENGTH"]/4, 0.0, 0.0))
     p_head_string_1 = np.array((-data["specs"]["TABLE_LENGTH"]/4, -data["specs"]["TABLE_LENGTH"]/4-data["specs"]["CUSHION_WIDTH"], 0.0))
     p_head_string_2 = np.array((-data["specs"]["TABLE_LENGTH"]/4, data["specs"]["TABLE_LENGTH"]/4+data["specs"]["CUSHION_WIDTH"], 0.0))
-    points = (p_head_spot, p_foot_spot, p_head_string_1, p_head_string_2)
-    uvs = [world_to_atlas_coords(faces_slate_top, p) for p in points]
-    scale = np.linalg.norm(WH*(world_to_atlas_coords(faces_slate_top, points[0]+E1)-uvs[0]))
+    points = np.array((p_head_spot, p_foot_spot, p_head_string_1, p_head_string_2, p_head_spot+E1))
+    uvs = AtlasLocator(faces_slate_top)(points)
+    scale = np.linalg.norm(WH*(uvs[4]-uvs[0]))
     # Draw head string:
     line_start = (WH[0]*uvs[2][0], WH[1]*uvs[2][1])
     line_end = (WH[0]*uvs[3][0], WH[1]*uvs[3][1])
@@ -229,43 +290,62 @@ def draw_markings(data, atlas):
         draw.ellipse(img_pos, fill=(50,50,45), outline=(0,0,0))
 
     # Diamonds on rail_sights:
+    r = data["specs"]["TABLE_RAIL_SIGHTS_RADIUS"]
     for cushion_name in ("A", "B", "C", "D", "E", "F"):
-        faces = data["rail_sights"][cushion_name].fs
-
-        for k in range(1, 4):
-            p = np.array((*sights_pos(data, cushion_name, k), data["specs"]["TABLE_RAIL_HEIGHT"]))
-
-            uv = world_to_atlas_coords(faces, p)
-
-            # Convert radius of sight from meters to pixels:
-            r = data["specs"]["TABLE_RAIL_SIGHTS_RADIUS"]
-            r_pixels = np.linalg.norm(WH*(world_to_atlas_coords(faces, p+r*E1)-uv))
+        locator = AtlasLocator(data["rail_sights"][cushion_name].fs)
+        p = np.array([(*sights_pos(data, cushion_name, k), data["specs"]["TABLE_RAIL_HEIGHT"]) for k in range(1, 4)])
+        uvs = locator(np.concatenate((p, p+r*E1)))
+        # Convert radius of sight from meters to pixels:
+        radii = np.linalg.norm(WH*(uvs[3:]-uvs[:3]), axis=1)
 
+        for uv, r_pixels in zip(uvs[:3], radii):
             img_pos = (WH[0]*uv[0]-r_pixels, WH[1]*uv[1]-r_pixels, WH[0]*uv[0]+r_pixels, WH[1]*uv[1]+r_pixels)
             draw.ellipse(img_pos, fill=(230,230,235), outline=(0,0,0))
 
     atlas.alpha_composite(overlay)
     
 
-def tile_image(source_image, target_wh):
-    """Creates a tiled version of the source image
+def chart_regions(data, bbox, mesh_name):
+    """Pixel regions (x0,y0,x1,y1) of the uv charts of the meshes data[mesh_name].
+    """
+    ppm = data["specs"]["UV_PIXELS_PER_METER"]
+    regions = []
+    for key in data[mesh_name]:
+        xy = (ppm*np.asarray(bbox[(mesh_name,key)][0])).astype(int)
+        wh = (ppm*np.asarray(bbox[(mesh_name,key)][1])).astype(int)
+        regions.append((xy[0], xy[1], xy[0]+wh[0], xy[1]+wh[1]))
+    return regions
+
+def paste_tiled(atlas, source, regions):
+    """Fills regions of atlas (H,W,4) with the source image tiled from the 
+    atlas origin, sampled by modular indexing. source is an (h,w,3) array or 
+    an RGB color.
+    """
+    H, W = atlas.shape[:2]
+    for x0, y0, x1, y1 in regions:
+        x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, W), min(y1, H)
+        if x0 >= x1 or y0 >= y1:
+            continue
+        if isinstance(source, np.ndarray):
+            rows = np.arange(y0, y1) % source.shape[0]
+            cols = np.arange(x0, x1) % source.shape[1]
+            atlas[y0:y1,x0:x1,:3] = source.take(rows, axis=0).take(cols, axis=1)
+        else:
+            atlas[y0:y1,x0:x1,:3] = source
+        atlas[y0:y1,x0:x1,3] = 255
+
+def chart_mask(data, wh, mesh_names):
+    """Coverage (H,W) of the faces of the meshes in an atlas of size wh, 
+    rasterized from the uv-coordinates in range 0..1.
     """
-    tiled_image = Image.new('RGB', (target_wh[0], target_wh[1]))
-    source_width, source_height = source_image.size
-    for y in range(0, target_wh[1], source_height):
-        for x in range(0, target_wh[0], source_width):
-            tiled_image.paste(source_image, (x, y))
-    return tiled_image
-
-def image_paste(target_img, source_img, data, bbox, mesh_name):
-    for key, mesh in data[mesh_name].items():
-        xy = (data["specs"]["UV_PIXELS_PER_METER"]*bbox[(mesh_name,key)][0][0], data["specs"]["UV_PIXELS_PER_METER"]*bbox[(mesh_name,key)][0][1])
-        wh = (data["specs"]["UV_PIXELS_PER_METER"]*bbox[(mesh_name,key)][1][0], data["specs"]["UV_PIXELS_PER_METER"]*bbox[(mesh_name,key)][1][1])
-        xy = np.array(xy).astype(int)
-        wh = np.array(wh).astype(int)
-        region = (xy[0], xy[1], xy[0]+wh[0], xy[1]+wh[1])
-        crop = source_img.crop(region)
-        target_img.paste(crop, (xy[0], xy[1]))
+    mask = Image.new("L", tuple(wh), 0)
+    draw = ImageDraw.Draw(mask)
+    for name in mesh_names:
+        for mesh in data[name].values():
+            for face in mesh.fs:
+                polygon = [tuple(np.array(wh)*uv) for uv in face.uvs]
+                draw.polygon(polygon, fill=255, outline=255)
+    return np.asarray(mask) > 0
 
 def create_atlas(data, bbox):
     bbox_all = np.array(((np.inf, np.inf), (-np.inf, -np.inf)))
@@ -277,20 +357,19 @@ def create_atlas(data, bbox):
     bbox_all[1] = (bbox_all[1][0]-bbox_all[0][0], bbox_all[1][1]-bbox_all[0][1])
     WH = (data["specs"]["UV_PIXELS_PER_METER"]*bbox_all[1][0], data["specs"]["UV_PIXELS_PER_METER"]*bbox_all[1][1])
     WH = np.ceil(WH).astype(int)
-    image1 = tile_image(Image.open("d:/resources/img/wood_dark.jpg"), WH)
-    image2 = tile_image(Image.open("d:/resources/img/cloth1.png"), WH)
-    image3 = tile_image(Image.open("d:/resources/img/contour.jpg"), WH)
-    image4 = tile_image(Image.open("d:/resources/img/wood1.jpg"), WH)
-    image5 = Image.new('RGB', (WH[0], WH[1]), (20, 20, 50))
-    image6 = Image.new('RGB', (WH[0], WH[1]), (100, 105, 95))
-    atlas = Image.new('RGBA', (WH[0], WH[1]), (50, 50, 100, 255))
-    image_paste(atlas, image2, data, bbox, "cushions")
-    image_paste(atlas, image2, data, bbox, "slate")
-    image_paste(atlas, image1, data, bbox, "rail_sights")
-    image_paste(atlas, image5, data, bbox, "rails")
-    image_paste(atlas, image3, data, bbox, "casing")
-    image_paste(atlas, image6, data, bbox, "liners")
-    return atlas, bbox_all
+    wood_dark = pooltable_textures.load_texture("wood_dark.jpg")
+    cloth = pooltable_textures.load_texture("cloth1.png")
+    contour = pooltable_textures.load_texture("contour.jpg")
+    # The charts are written straight into one buffer, later pastes overwrite earlier ones:
+    atlas = np.empty((WH[1], WH[0], 4), dtype=np.uint8)
+    atlas[:,:] = (50, 50, 100, 255)
+    paste_tiled(atlas, cloth, chart_regions(data, bbox, "cushions"))
+    paste_tiled(atlas, cloth, chart_regions(data, bbox, "slate"))
+    paste_tiled(atlas, wood_dark, chart_regions(data, bbox, "rail_sights"))
+    paste_tiled(atlas, (20, 20, 50), chart_regions(data, bbox, "rails"))
+    paste_tiled(atlas, contour, chart_regions(data, bbox, "casing"))
+    paste_tiled(atlas, (100, 105, 95), chart_regions(data, bbox, "liners"))
+    return Image.fromarray(atlas, "RGBA"), bbox_all
 
 def run(data):
     mesh_names = ("cushions", "slate", "rails", "rail_sights", "liners", "casing")
@@ -325,7 +404,7 @@ def run(data):
     for name in mesh_names:
         wh_list = []
         for key, mesh in data[name].items():
-            bbox[(name, key)] = uv_bounding_box(mesh, data["specs"]["UV_TEXTURE_GAP"]/data["specs"]["UV_PIXELS_PER_METER"])
+            bbox[(name, key)] = uv_bounding_box(mesh)
             packing_indexing[(name, key)] = len(wh_all)
             wh_list.append(bbox[(name, key)][1,:])
             wh_all.append(bbox[(name, key)][1,:])
@@ -335,18 +414,18 @@ def run(data):
 
     wh_all = np.array(wh_all)
     wh_all = np.array((wh_all[:,0], wh_all[:,1]))
-    packing = packer.pack(wh_all)
+    packing, gap = pack_charts(wh_all, data["specs"]["UV_TEXTURE_GAP"], data["specs"]["UV_PIXELS_PER_METER"], data["specs"]["UV_PACKING_STRATEGY"])
 
     # Apply the packing to the uv-coords:
     for name in mesh_names:
         for key, mesh in data[name].items():
-            xy = packing[0][0:2,packing_indexing[(name, key)]] - bbox[(name, key)][0,:]
+            xy = packing[0:2,packing_indexing[(name, key)]] + gap - bbox[(name, key)][0,:]
             transform_uvs(mesh, 1.0, complex(xy[0], xy[1]))
 
     # We still need to create the atlas image by patching multiple source images together:
     for name in mesh_names:
         for key, mesh in data[name].items():
-            bbox[(name, key)] = uv_bounding_box(mesh, data["specs"]["UV_TEXTURE_GAP"]/data["specs"]["UV_PIXELS_PER_METER"])
+            bbox[(name, key)] = uv_bounding_box(mesh, gap)
     atlas, bbox_all = create_atlas(data, bbox)
     
     # Scale uv coords to 0..1 range:
@@ -359,11 +438,12 @@ def run(data):
                     face.uvs[k] = np.array((uv_x, uv_y))
 
     draw_markings(data, atlas)
+    mask = chart_mask(data, atlas.size, mesh_names)
 
-    file_name = "obj/atlas.jpg"
-    atlas = atlas.transpose(Image.Transpose.FLIP_TOP_BOTTOM).convert("RGB")
-    atlas.save(file_name, quality=80)
-    print(f"File {file_name} written.")
+    # Fill the gutter with chart border colors and write obj/atlas.jpg and the other resolutions:
+    atlas = np.asarray(atlas.transpose(Image.Transpose.FLIP_TOP_BOTTOM).convert("RGB"))
+    atlas = pooltable_mipmaps.push_pull(atlas, mask[::-1])
+    pooltable_mipmaps.write_tiers(atlas, mask[::-1], "obj/atlas", gap=gap*data["specs"]["UV_PIXELS_PER_METER"])
 
     return data
 
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+import mesh3
+import pooltable, pooltable_specs, pooltable_geometry, pooltable_normals
+
+def corner_normal_angles(packed):
+    """Largest angle (degrees) between a corner normal and its face normal, per face.
+    """
+    triangles = packed.corner_positions.reshape(-1, 3, 3)
+    face_n = mesh3._unit_normals(triangles)
+    cos = np.einsum("fkj,fj->fk", packed.normals.reshape(-1, 3, 3), face_n)
+    return np.degrees(np.arccos(np.clip(np.min(cos, axis=1), -1.0, 1.0)))
+
+@pytest.fixture(scope="module")
+def table():
+    data = pooltable_normals.run(pooltable_geometry.run(pooltable_specs.run()))
+    packed = []
+    for name in ("slate", "rails", "rail_sights", "liners", "casing"):
+        meshes = [mesh3.PackedMesh3.from_mesh(mesh.triangulate()) for mesh in data[name].values()]
+        packed.append(mesh3.PackedMesh3.merge(meshes, [name]*len(meshes)))
+    return mesh3.PackedMesh3.merge(packed).weld_positions()
+
+def test_lod_corner_normals(table):
+    assert np.max(corner_normal_angles(table)) < 45.0
+    lods = pooltable.levels_of_detail(table)
+    assert len(lods) == len(pooltable.LOD_ANGLES)
+    n_faces = table.n_faces
+    for lod, (_, max_normal_angle) in zip(lods, pooltable.LOD_ANGLES):
+        assert lod.n_faces < n_faces
+        n_faces = lod.n_faces
+        assert np.max(corner_normal_angles(lod)) <= max_normal_angle + 1.0e-6
+
+def test_levels_of_detail_skip_equal(table):
+    lods = pooltable.levels_of_detail(table, ((30.0, 40.0), (30.0, 40.0), (20.0, 30.0)))
+    assert len(lods) == 1
@@ -0,0 +1,12 @@
+import mesh3
+import pooltable_diagnostics
+
+def test_non_planar_polygon():
+    vertices = [(0, 0, 0), (1, 0, 0), (1, 1, 0.1), (0, 1, 0), (2, 0, 0), (2, 1, 0.1)]
+    mesh = mesh3.Mesh3.from_polygons(vertices, [(0, 1, 2, 3), (1, 4, 5, 2)])
+    report = pooltable_diagnostics.mesh_diagnostics(mesh)
+    assert report["non_planar_faces"] == [0]
+    assert report["faces"] == 2 and report["triangles"] == 0
+    # Triangulation hides the problem:
+    report = pooltable_diagnostics.mesh_diagnostics(mesh.triangulate())
+    assert report["non_planar_faces"] == []
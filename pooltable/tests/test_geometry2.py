@@ -0,0 +1,44 @@
+import numpy as np
+import geometry2
+
+def brute_force_pairs(poly):
+    n = poly.n
+    return { (k1, k2) for k1 in range(n) for k2 in range(k1+1, n) if poly.edges_conflict(k1, k2) }
+
+def random_polygons(rng, count):
+    for k in range(count):
+        n = rng.integers(4, 25)
+        if k % 3 == 0:
+            zs = rng.random((n, 2))                     # mostly self-intersecting
+        elif k % 3 == 1:
+            angles = np.sort(rng.random(n)*2.0*np.pi)   # star-shaped, mostly simple
+            zs = (0.2 + rng.random(n))[:,None] * np.column_stack((np.cos(angles), np.sin(angles)))
+        else:
+            zs = rng.integers(0, 5, (n, 2)).astype(float)   # touching and collinear edges
+            if np.any(np.all(zs == np.roll(zs, -1, axis=0), axis=1)):
+                continue
+        yield geometry2.Polygon2(zs)
+
+def test_sweep_matches_brute_force():
+    rng = np.random.default_rng(6)
+    simple_count = 0
+    for poly in random_polygons(rng, 600):
+        expected = brute_force_pairs(poly)
+        first = poly.intersecting_edges(first_only=True)
+        pairs = set(poly.intersecting_edges())
+        assert (len(first) == 0) == (len(expected) == 0), poly.zs
+        assert pairs <= expected
+        assert poly.check() == (len(expected) == 0)
+        simple_count += len(expected) == 0
+    assert simple_count > 50
+
+def test_vertex_touching_edge():
+    # Vertex 3 touches the edge (0,1) without crossing it:
+    poly = geometry2.Polygon2(np.array(((0.0, 0.0), (4.0, 0.0), (4.0, 3.0), (2.0, 0.0), (0.0, 3.0))))
+    assert not poly.check()
+    assert (0, 2) in poly.intersecting_edges() or (0, 3) in poly.intersecting_edges()
+    # Edge 1 folds back over edge 0:
+    spike = geometry2.Polygon2(np.array(((0.0, 0.0), (3.0, 0.0), (2.0, 0.0), (2.0, 1.0))))
+    assert spike.intersecting_edges() == [(0, 1)]
+    square = geometry2.Polygon2(np.array(((0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0))))
+    assert square.check()
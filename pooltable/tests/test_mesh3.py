@@ -0,0 +1,110 @@
+import numpy as np
+import mesh3
+
+def square_mesh():
+    vertices = [(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (2, 0, 0), (2, 1, 0)]
+    return mesh3.Mesh3.from_polygons(vertices, [(0, 1, 2, 3), (1, 4, 5, 2)])
+
+def test_adjacency_cache_detects_direct_edits():
+    mesh = square_mesh()
+    adjacency = mesh.adjacency()
+    assert mesh.adjacency() is adjacency
+    assert len(adjacency.face_offsets) == 3
+
+    mesh.fs.append(mesh3.Face3(np.array(((2, 0, 0), (3, 0, 0), (2, 1, 0)), dtype=float)))
+    assert len(mesh.adjacency().face_offsets) == 4
+
+    mesh.fs[0] = mesh3.Face3(np.array(((0, 0, 0), (1, 0, 0), (1, 1, 0)), dtype=float))
+    assert mesh.adjacency().face_offsets[1] == 3
+
+def test_triangulate_adjacency():
+    tri_mesh = square_mesh().triangulate()
+    assert tri_mesh.is_triangle_mesh()
+    adjacency = tri_mesh.adjacency()
+    assert len(adjacency.face_offsets)-1 == len(tri_mesh.fs) == 4
+    assert adjacency.n_vertices == 6
+
+def brute_force_weld(points, EPSILON):
+    """Labels of points by the smallest index in their transitive closeness class.
+    """
+    n = len(points)
+    labels = list(range(n))
+    def find(i):
+        while labels[i] != i:
+            i = labels[i]
+        return i
+    for i in range(n):
+        for j in range(i):
+            if np.sum((points[i]-points[j])**2) < EPSILON**2:
+                a, b = find(i), find(j)
+                labels[max(a, b)] = min(a, b)
+    return np.array([find(i) for i in range(n)])
+
+def test_weld_matches_brute_force():
+    rng = np.random.default_rng(1)
+    EPSILON = 0.05
+    for d in (1, 2, 3):
+        for _ in range(20):
+            points = rng.integers(0, 8, size=(rng.integers(1, 200), d)) * 0.03 + rng.normal(0.0, 0.01, size=(1, d))
+            points += rng.normal(0.0, 0.005, size=points.shape)
+            unique_points, indexing = mesh3.weld(points, EPSILON)
+            labels = brute_force_weld(points, EPSILON)
+            representatives = np.unique(labels)
+            assert np.array_equal(unique_points, points[representatives])
+            assert np.array_equal(representatives[indexing], labels)
+
+def test_weld_coincident_points():
+    rng = np.random.default_rng(3)
+    # Many copies of a few points, some of them perturbed far below EPSILON:
+    points = np.repeat(rng.normal(size=(20, 3)), 5000, axis=0)
+    points[::3] += rng.normal(0.0, 1.0e-13, size=points[::3].shape)
+    points = points[rng.permutation(len(points))]
+    unique_points, indexing = mesh3.weld(points)
+    assert len(unique_points) == 20
+    assert np.allclose(unique_points[indexing], points, atol=1.0e-12)
+    small = points[::500]
+    assert np.array_equal(mesh3.weld(small)[1], np.unique(brute_force_weld(small, 1.0e-9), return_inverse=True)[1])
+
+def check_cell_codes(cells, scalar):
+    codes = mesh3._CellCodes(cells)
+    assert codes.scalar == scalar
+    lookup = { tuple(cell): k for k, cell in enumerate(cells.tolist()) }
+    d = cells.shape[1]
+    for offset in [(0,)*d, (1,) + (0,)*(d-1), (0,)*(d-1) + (-1,), (-1,)*d]:
+        expected = [lookup.get(tuple(cell), -1) for cell in (cells + np.array(offset)).tolist()]
+        assert codes.find(offset).tolist() == expected
+        assert max(expected) >= 0 or offset == (-1,)*d
+
+def test_cell_codes():
+    rng = np.random.default_rng(2)
+    for d, scalar in ((3, True), (10, False)):
+        # With d=10 and about 150 distinct values per coordinate the codes do not fit in int64:
+        base = rng.integers(0, 1000, size=(150, d))
+        shifted = [base + np.eye(d, dtype=np.int64)[k] for k in (0, d-1)]
+        cells = np.unique(np.concatenate([base] + shifted), axis=0)
+        check_cell_codes(cells, scalar)
+
+def grid_mesh(n, rng):
+    """Shuffled triangles of an n x n grid with a uv seam down the middle.
+    """
+    x, y = np.meshgrid(np.arange(n+1), np.arange(n+1))
+    positions = np.column_stack((x.ravel(), y.ravel(), np.zeros(x.size))).astype(float)
+    quads = [(i*(n+1)+j, i*(n+1)+j+1, (i+1)*(n+1)+j+1, (i+1)*(n+1)+j) for i in range(n) for j in range(n)]
+    triangles = np.array([t for a, b, c, d in quads for t in ((a, b, c), (a, c, d))])
+    triangles = triangles[rng.permutation(len(triangles))]
+    corners = positions[triangles.ravel()]
+    # Triangles right of the middle column get their own uvs:
+    right = np.repeat(corners[:,0].reshape(-1, 3).min(axis=1) >= n//2, 3)
+    uvs = corners[:,:2] + 10.0*right[:,None]
+    normals = np.tile((0.0, 0.0, 1.0), (len(corners), 1))
+    return mesh3.PackedMesh3(positions, 3*np.arange(len(triangles)+1), triangles.ravel(), normals, uvs)
+
+def test_optimize_vertex_cache_gpu_vertices():
+    mesh = grid_mesh(16, np.random.default_rng(6))
+    before = mesh3.cache_miss_ratio(mesh3.corner_vertices(mesh), 16)
+    optimized = mesh.optimize_vertex_cache(16)
+    vertices = mesh3.corner_vertices(optimized)
+    after = mesh3.cache_miss_ratio(vertices, 16)
+    assert after < 0.75*before
+    # The seam splits vertices, so there are more GPU vertices than positions:
+    assert vertices.max()+1 > len(optimized.positions)
@@ -0,0 +1,37 @@
+import numpy as np
+import pooltable_mipmaps
+
+def test_mip_level_shapes():
+    rng = np.random.default_rng(4)
+    for H, W in ((37, 100), (1, 5), (64, 64), (255, 3), (6, 7)):
+        image = rng.uniform(0.0, 255.0, size=(H, W, 3))
+        levels = pooltable_mipmaps.mip_chain(*pooltable_mipmaps.premultiply(image, np.ones((H, W))))
+        assert len(levels) == int(np.log2(max(H, W))) + 1
+        for k, level in enumerate(levels):
+            assert level.shape == (max(1, H >> k), max(1, W >> k), 3)
+        assert np.min(levels[-1]) >= np.min(image) and np.max(levels[-1]) <= np.max(image)
+        constant = pooltable_mipmaps.mip_chain(*pooltable_mipmaps.premultiply(np.full((H, W, 3), 7.0), rng.uniform(size=(H, W))))
+        assert all(np.allclose(level, 7.0) for level in constant)
+
+def test_push_pull_odd_size():
+    image = np.zeros((13, 11, 3), dtype=np.uint8)
+    mask = np.zeros((13, 11), dtype=bool)
+    mask[2:5,3:9] = True
+    image[mask] = (200, 100, 50)
+    filled = pooltable_mipmaps.push_pull(image, mask)
+    assert filled.shape == image.shape
+    assert np.all(filled == (200, 100, 50))
+
+def test_max_level_keeps_charts_apart():
+    gap = 4
+    a = np.zeros((64, 96), dtype=np.float32)
+    b = np.zeros((64, 96), dtype=np.float32)
+    a[8:40,8:40] = 1.0
+    b[8:40,40+2*gap:80] = 1.0
+    assert pooltable_mipmaps.max_level(gap, 1.0, 7) == 2
+    assert pooltable_mipmaps.max_level(gap, 0.5, 7) == 1
+    assert pooltable_mipmaps.max_level(gap, 0.2, 7) == 0
+    for k in range(pooltable_mipmaps.max_level(gap, 1.0, 7) + 1):
+        assert not np.any((a > 0.0) & (b > 0.0))
+        a, b = pooltable_mipmaps.downsample(a[...,None], b)
+        a = a[...,0]
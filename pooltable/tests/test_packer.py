@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+import packer
+
+def overlapping_pairs(packing):
+    """Pairs of rectangles (columns x,y,w,h) whose interiors intersect.
+    """
+    x, y, w, h = packing
+    overlap_x = np.minimum(x[:,None]+w[:,None], x+w) - np.maximum(x[:,None], x)
+    overlap_y = np.minimum(y[:,None]+h[:,None], y+h) - np.maximum(y[:,None], y)
+    i, j = np.nonzero((overlap_x > 1.0e-12) & (overlap_y > 1.0e-12))
+    return [(a, b) for a, b in zip(i, j) if a < b]
+
+@pytest.mark.parametrize("strategy", sorted(packer.PACKING_STRATEGIES))
+def test_pack_float_sizes(strategy):
+    np.random.seed(3)
+    # Chart sizes in meters as in pooltable_uv:
+    wh_list = np.random.uniform(0.01, 0.4, size=(2, 60))
+    packing, _ = packer.pack(wh_list, strategy=strategy)
+    assert packing is not None
+    assert np.array_equal(packing[2:], wh_list)
+    assert np.all(packing[:2] >= 0.0)
+    assert overlapping_pairs(packing) == []
@@ -0,0 +1,13 @@
+import importlib, os
+import pooltable_textures
+
+def test_asset_dir(monkeypatch):
+    module_dir = os.path.dirname(os.path.abspath(pooltable_textures.__file__))
+    monkeypatch.delenv("POOLTABLE_ASSET_DIR", raising=False)
+    textures = importlib.reload(pooltable_textures)
+    assert textures.asset_path("cloth1.png") == os.path.join(module_dir, "resources", "img", "cloth1.png")
+    monkeypatch.setenv("POOLTABLE_ASSET_DIR", "assets")
+    textures = importlib.reload(pooltable_textures)
+    assert textures.asset_path("cloth1.png") == os.path.join("assets", "cloth1.png")
+    monkeypatch.undo()
+    importlib.reload(pooltable_textures)
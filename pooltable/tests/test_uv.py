@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+import mesh3
+import pooltable_specs, pooltable_geometry, pooltable_uv
+
+def test_unwrap_cushion_rejects_faces_off_planes():
+    data = pooltable_geometry.run(pooltable_specs.run())
+    cushion = next(iter(data["cushions"]))
+    mesh = data["cushions"][cushion]
+    center = np.mean(np.concatenate([face.pts for face in mesh.fs]), axis=0)
+    stray = mesh3.Face3(center + np.array(((0, 0, 0), (0.01, 0.002, 0.003), (0.001, 0.01, 0.007))))
+    mesh.add_face(stray)
+    with pytest.raises(ValueError):
+        pooltable_uv.unwrap_cushion(data, cushion)
+
+def packed_area(packing):
+    return np.max(packing[0]+packing[2]) * np.max(packing[1]+packing[3])
+
+def test_pack_charts_gap():
+    wh_list = np.random.default_rng(5).uniform(0.05, 3.0, size=(2, 40))
+    pixels_per_meter = 128
+    areas = {}
+    for gap in (2, 8):
+        areas[gap] = []
+        for seed in range(4):
+            np.random.seed(seed)
+            packing, margin = pooltable_uv.pack_charts(wh_list, gap, pixels_per_meter, "maxrects")
+            assert margin == gap / pixels_per_meter
+            assert np.allclose(packing[2:], wh_list + 2.0*margin)
+            areas[gap].append(packed_area(packing))
+    # Narrow gaps give a smaller atlas:
+    assert np.mean(areas[2]) < np.mean(areas[8])